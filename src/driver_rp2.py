@@ -1,9 +1,157 @@
 import time
 
-from log import error, trace, debug, info, LogLevel
+from log import error, trace, debug, info, LogLevel, LazyHex
 from nand import NandConfig, NandCmd, NandStatus
 
-from machine import Pin
+import micropython
+import rp2
+from machine import Pin, mem32
+from micropython import const
+
+# RP2040 SIO registers (GPIO0-29 bit mask)
+SIO_BASE = const(0xD0000000)
+SIO_GPIO_IN = const(SIO_BASE + 0x004)
+SIO_GPIO_OUT = const(SIO_BASE + 0x010)
+SIO_GPIO_OUT_SET = const(SIO_BASE + 0x014)
+SIO_GPIO_OUT_CLR = const(SIO_BASE + 0x018)
+SIO_GPIO_OUT_XOR = const(SIO_BASE + 0x01C)
+SIO_GPIO_OE_SET = const(SIO_BASE + 0x024)
+SIO_GPIO_OE_CLR = const(SIO_BASE + 0x028)
+
+# NandIo pin assignments as SIO bit masks
+IO_MASK = const(0xFF)  # IO0-7 = GPIO0-7
+CEB_MASK = const((1 << 8) | (1 << 9))  # CE#0-1 = GPIO8-9
+CLE_MASK = const(1 << 10)
+ALE_MASK = const(1 << 11)
+WEB_MASK = const(1 << 13)
+REB_MASK = const(1 << 14)
+
+# RP2040 IO_BANK0 GPIOn_CTRL (FUNCSEL[4:0])
+IO_BANK0_BASE = const(0x40014000)
+GPIO_FUNC_SIO = const(5)
+GPIO_FUNC_PIO0 = const(6)
+
+# RP2040 PIO0 TX FIFO (SM0) / DREQ
+PIO0_BASE = const(0x50200000)
+PIO0_TXF0 = const(PIO0_BASE + 0x010)
+DREQ_PIO0_TX0 = const(0)
+
+# wait_busy: spinで待つ回数と、その後のpoll間隔
+WAIT_BUSY_SPIN_COUNT = const(64)
+WAIT_BUSY_SLEEP_US = const(50)
+
+# PIO clock (1cycle = 40ns)
+PIO_FREQ = const(25_000_000)
+# これより短い転送はPIOへの切り替えコストの方が大きいのでSIOで行う
+PIO_MIN_BYTES = const(16)
+
+
+def gpio_ctrl_addr(pin: int) -> int:
+    return IO_BANK0_BASE + 8 * pin + 4
+
+
+@micropython.viper
+def sio_input_bytes(buf, num_bytes: int, latch_mask: int):
+    """buf[0:num_bytes] を順に IO[7:0] へ出力して WE# をstrobeする
+    latch_mask (CLE/ALE) は全cycleの間Hを保持する
+    """
+    out = ptr32(SIO_GPIO_OUT)
+    out_set = ptr32(SIO_GPIO_OUT_SET)
+    out_clr = ptr32(SIO_GPIO_OUT_CLR)
+    out_xor = ptr32(SIO_GPIO_OUT_XOR)
+    src = ptr8(buf)
+    out_set[0] = latch_mask
+    for i in range(num_bytes):
+        out_xor[0] = (out[0] ^ src[i]) & IO_MASK
+        # tWP確保のため同じstoreを繰り返す
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_set[0] = WEB_MASK
+    out_clr[0] = latch_mask
+
+
+@micropython.viper
+def sio_input_cmd_addrs(cmd1: int, addrs, num_addrs: int, cmd2: int):
+    """Command(CLE=H) -> Address x num_addrs(ALE=H) -> Command(CLE=H) を1回の呼び出しで出力する
+    cmd2 < 0 の場合は2nd Commandを省略する
+    """
+    out = ptr32(SIO_GPIO_OUT)
+    out_set = ptr32(SIO_GPIO_OUT_SET)
+    out_clr = ptr32(SIO_GPIO_OUT_CLR)
+    out_xor = ptr32(SIO_GPIO_OUT_XOR)
+    src = ptr8(addrs)
+    # 1st Command
+    out_set[0] = CLE_MASK
+    out_xor[0] = (out[0] ^ cmd1) & IO_MASK
+    out_clr[0] = WEB_MASK
+    out_clr[0] = WEB_MASK
+    out_clr[0] = WEB_MASK
+    out_set[0] = WEB_MASK
+    out_clr[0] = CLE_MASK
+    # Address
+    out_set[0] = ALE_MASK
+    for i in range(num_addrs):
+        out_xor[0] = (out[0] ^ src[i]) & IO_MASK
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_set[0] = WEB_MASK
+    out_clr[0] = ALE_MASK
+    # 2nd Command
+    if cmd2 >= 0:
+        out_set[0] = CLE_MASK
+        out_xor[0] = (out[0] ^ cmd2) & IO_MASK
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_clr[0] = WEB_MASK
+        out_set[0] = WEB_MASK
+        out_clr[0] = CLE_MASK
+
+
+@micropython.viper
+def sio_output_bytes(buf, num_bytes: int):
+    """RE# strobe毎に IO[7:0] を読み出して buf[0:num_bytes] へ格納する"""
+    gpio_in = ptr32(SIO_GPIO_IN)
+    out_set = ptr32(SIO_GPIO_OUT_SET)
+    out_clr = ptr32(SIO_GPIO_OUT_CLR)
+    dst = ptr8(buf)
+    for i in range(num_bytes):
+        # tREA + 入力同期の遅延分、同じstoreを繰り返して待つ
+        out_clr[0] = REB_MASK
+        out_clr[0] = REB_MASK
+        out_clr[0] = REB_MASK
+        out_clr[0] = REB_MASK
+        dst[i] = gpio_in[0] & IO_MASK
+        out_set[0] = REB_MASK
+        out_set[0] = REB_MASK
+
+
+@rp2.asm_pio(
+    out_init=(rp2.PIO.OUT_LOW,) * 8,
+    sideset_init=rp2.PIO.OUT_HIGH,
+    out_shiftdir=rp2.PIO.SHIFT_RIGHT,
+)
+def pio_data_input():
+    # WE#=H で待機し、1byte毎に IO[7:0] 出力 + WE# strobe (立ち上がりでlatch)
+    pull(block).side(1)  # type: ignore
+    out(pins, 8).side(0)[1]  # type: ignore
+
+
+@rp2.asm_pio(
+    sideset_init=rp2.PIO.OUT_HIGH,
+    in_shiftdir=rp2.PIO.SHIFT_LEFT,
+    autopush=True,
+    push_thresh=8,
+)
+def pio_data_output():
+    # 読み出しbyte数-1を受け取り、RE# strobe毎に IO[7:0] を RX FIFO へ送る
+    pull(block).side(1)  # type: ignore
+    mov(x, osr).side(1)  # type: ignore
+    label("loop")  # type: ignore
+    nop().side(0)[2]  # type: ignore
+    in_(pins, 8).side(0)  # type: ignore
+    jmp(x_dec, "loop").side(1)[1]  # type: ignore
 
 
 class NandIo:
@@ -11,9 +159,35 @@ class NandIo:
         self,
         delay_us: int = 0,
         keep_wp: bool = True,
+        use_pio: bool = True,
     ) -> None:
         self._delay_us = delay_us
         self._keep_wp = keep_wp
+        # delayを入れる場合はPIOを使わずSIOで転送する
+        self._use_pio = use_pio and delay_us == 0
+        # Data Input/Output用PIO (初期化時にPIO機能へ切り替わるので、setup_pinでSIOに戻す)
+        self._sm_din = rp2.StateMachine(
+            0, pio_data_input, freq=PIO_FREQ, out_base=Pin(0), sideset_base=Pin(13)
+        )
+        self._sm_dout = rp2.StateMachine(
+            1, pio_data_output, freq=PIO_FREQ, in_base=Pin(0), sideset_base=Pin(14)
+        )
+        # burst中のみPIO機能へ切り替えるpin
+        self._din_ctrls = tuple(
+            gpio_ctrl_addr(pin) for pin in (0, 1, 2, 3, 4, 5, 6, 7, 13)
+        )
+        self._dout_ctrls = (gpio_ctrl_addr(14),)
+        # Data Input時は DMA で TX FIFO へ1byteずつ転送する (rp2.DMAが無いfirmwareでは sm.put で代用)
+        self._dma = None
+        self._dma_ctrl = 0
+        if self._use_pio:
+            try:
+                self._dma = rp2.DMA()
+                self._dma_ctrl = self._dma.pack_ctrl(
+                    size=0, inc_read=True, inc_write=False, treq_sel=DREQ_PIO0_TX0
+                )
+            except (AttributeError, OSError):
+                self._dma = None
         self._io0 = Pin(0, Pin.OUT)
         self._io1 = Pin(1, Pin.OUT)
         self._io2 = Pin(2, Pin.OUT)
@@ -31,42 +205,36 @@ class NandIo:
         self._reb = Pin(14, Pin.OUT)
         self._rbb = Pin(15, Pin.IN, Pin.PULL_UP)
 
-        self._io = [
-            self._io0,
-            self._io1,
-            self._io2,
-            self._io3,
-            self._io4,
-            self._io5,
-            self._io6,
-            self._io7,
-        ]
-        self._ceb = [self._ceb0, self._ceb1]
         # debug indicator
         self._led = Pin("LED", Pin.OUT, value=1)
         self.setup_pin()
+        # pull待ち (WE#/RE#=H) で停止させておく
+        self._sm_din.active(1)
+        self._sm_dout.active(1)
 
     def delay(self) -> None:
-        time.sleep_us(self._delay_us)
+        if self._delay_us > 0:
+            time.sleep_us(self._delay_us)
 
     ########################################################
     # Low-level functions
     ########################################################
 
-    def set_io(self, value: int) -> None:
-        for i in range(8):
-            self._io[i].value((value >> i) & 0x1)
+    @micropython.viper
+    def set_io(self, value: int):
+        # IO[7:0]のみを反転させて一度に書き換える
+        out = ptr32(SIO_GPIO_OUT)
+        out_xor = ptr32(SIO_GPIO_OUT_XOR)
+        out_xor[0] = (out[0] ^ value) & IO_MASK
 
+    @micropython.viper
     def get_io(self) -> int:
-        value = 0
-        for i in range(8):
-            value |= self._io[i].value() << i
-        return value
+        gpio_in = ptr32(SIO_GPIO_IN)
+        return gpio_in[0] & IO_MASK
 
     def set_io_dir(self, is_output: bool) -> None:
-        trace(f"IO\tIO\t{'OUT' if is_output else 'IN'}")
-        for pin in self._io:
-            pin.init(Pin.OUT if is_output else Pin.IN)
+        trace("IO\tIO\t%s", "OUT" if is_output else "IN")
+        mem32[SIO_GPIO_OE_SET if is_output else SIO_GPIO_OE_CLR] = IO_MASK
 
     def set_ceb(self, chip_index: int | None) -> None:
         # status indicator
@@ -78,7 +246,7 @@ class NandIo:
             self._ceb0.on()
             self._ceb1.on()
         else:
-            trace(f"IO\tCS\t{chip_index}")
+            trace("IO\tCS\t%d", chip_index)
             self._ceb0.value(0 if chip_index == 0 else 1)
             self._ceb1.value(0 if chip_index == 1 else 1)
 
@@ -91,33 +259,49 @@ class NandIo:
     def set_web(self, value: int) -> None:
         self._web.value(value)
 
-    def set_wpb(self, value: int) -> None:
+    def set_wpb(self, value: int, settle_us: int = 100) -> None:
         self._wpb.value(value)
-        trace(f"IO\tWPB\t{value}")
-        time.sleep_us(100)
+        trace("IO\tWPB\t%s", value)
+        # WP#切り替え後の安定待ち (待ちが不要な箇所はsettle_us=0を指定する)
+        if settle_us > 0:
+            time.sleep_us(settle_us)
+
+    @property
+    def keep_wp(self) -> bool:
+        return self._keep_wp
+
+    def set_keep_wp(self, keep_wp: bool) -> None:
+        # Write Protectの設定を変更し、WP#を駆動し直す (PIO/DMAの再初期化は不要)
+        self._keep_wp = keep_wp
+        if keep_wp:
+            self.set_wpb(0)
+            info("IO\tWPB\tWrite Protect Enable")
+        else:
+            self.set_wpb(1)
+            info("IO\tWPB\tWrite Protect Disable")
 
     def set_reb(self, value: int) -> None:
         self._reb.value(value)
 
+    def set_gpio_func(self, ctrls: tuple[int, ...], func: int) -> None:
+        for ctrl in ctrls:
+            mem32[ctrl] = func
+
     def setup_pin(self) -> None:
         trace("IO\tSETUP")
-        for pin in self._io:
-            pin.init(Pin.OUT)
-            pin.off()
-        for pin in self._ceb:
-            pin.init(Pin.OUT)
-            pin.on()
+        self.set_gpio_func(self._din_ctrls + self._dout_ctrls, GPIO_FUNC_SIO)
+        # IO0-7: output, low
+        mem32[SIO_GPIO_OUT_CLR] = IO_MASK
+        mem32[SIO_GPIO_OE_SET] = IO_MASK
+        # CE#0-1: output, high (deselect)
+        mem32[SIO_GPIO_OUT_SET] = CEB_MASK
+        mem32[SIO_GPIO_OE_SET] = CEB_MASK
         self._cle.init(Pin.OUT)
         self._cle.off()
         self._ale.init(Pin.OUT)
         self._ale.off()
         self._wpb.init(Pin.OUT)
-        if self._keep_wp:
-            self.set_wpb(0)
-            info("IO\tWPB\tWrite Protect Enable")
-        else:
-            self.set_wpb(1)
-            info("IO\tWPB\tWrite Protect Disable")
+        self.set_keep_wp(self._keep_wp)
         self._web.init(Pin.OUT)
         self._web.on()
         self._reb.init(Pin.OUT)
@@ -137,45 +321,129 @@ class NandIo:
         self.set_reb(1)
 
     def input_cmd(self, cmd: int) -> None:
-        trace(f"IO\tCMD\t{cmd:02X}")
-        self.set_io(cmd)
-        self.set_cle(1)
-        self.set_web(0)
+        trace("IO\tCMD\t%02X", cmd)
+        # IO[7:0] = cmd (他のpinは変化させない), CLE=1
+        mem32[SIO_GPIO_OUT_XOR] = (mem32[SIO_GPIO_OUT] ^ cmd) & IO_MASK
+        mem32[SIO_GPIO_OUT_SET] = CLE_MASK
+        # WE# strobe
+        mem32[SIO_GPIO_OUT_CLR] = WEB_MASK
         self.delay()
-        self.set_web(1)
-        self.set_cle(0)
+        mem32[SIO_GPIO_OUT_SET] = WEB_MASK
+        mem32[SIO_GPIO_OUT_CLR] = CLE_MASK
 
     def input_addrs(self, addrs: bytearray) -> None:
-        trace(f"IO\tADDR\t{addrs.hex()}")
+        trace("IO\tADDR\t%s", LazyHex(addrs))
+        if self._delay_us == 0:
+            sio_input_bytes(addrs, len(addrs), ALE_MASK)
+            return
+        # 全Address Cycleの間ALE=1を維持する
+        mem32[SIO_GPIO_OUT_SET] = ALE_MASK
+        # loop内の属性参照を避ける
+        mem = mem32
+        delay = self.delay
         for addr in addrs:
-            self.set_io(addr)
-            self.set_ale(1)
-            self.set_web(0)
-            self.delay()
-            self.set_web(1)
-            self.set_ale(0)
+            mem[SIO_GPIO_OUT_XOR] = (mem[SIO_GPIO_OUT] ^ addr) & IO_MASK
+            # WE# strobe
+            mem[SIO_GPIO_OUT_CLR] = WEB_MASK
+            delay()
+            mem[SIO_GPIO_OUT_SET] = WEB_MASK
+        mem32[SIO_GPIO_OUT_CLR] = ALE_MASK
+
+    def input_cmd_addrs(
+        self, cmd1: int, addrs: bytearray, cmd2: int | None = None
+    ) -> None:
+        """1st Command + Address (+ 2nd Command) をまとめて入力する"""
+        trace("IO\tCMD_ADDR\t%02X\t%s\t%s", cmd1, LazyHex(addrs), cmd2)
+        if self._delay_us == 0:
+            sio_input_cmd_addrs(cmd1, addrs, len(addrs), -1 if cmd2 is None else cmd2)
+            return
+        self.input_cmd(cmd1)
+        self.input_addrs(addrs)
+        if cmd2 is not None:
+            self.input_cmd(cmd2)
 
     def input_addr(self, addr: int) -> None:
         self.input_addrs(bytearray([addr]))
 
-    def output_data(self, num_bytes: int) -> bytearray:
-        datas = bytearray()
+    def input_data(self, data: bytearray) -> None:
+        if self._use_pio and len(data) >= PIO_MIN_BYTES:
+            sm = self._sm_din
+            self.set_gpio_func(self._din_ctrls, GPIO_FUNC_PIO0)
+            dma = self._dma
+            if dma is not None:
+                dma.config(
+                    read=data,
+                    write=PIO0_TXF0,
+                    count=len(data),
+                    ctrl=self._dma_ctrl,
+                    trigger=True,
+                )
+                while dma.active():
+                    pass
+            else:
+                sm.put(data)
+            # TX FIFO空 + 最終byteのstrobe完了待ち
+            while sm.tx_fifo() > 0:
+                pass
+            time.sleep_us(1)
+            self.set_gpio_func(self._din_ctrls, GPIO_FUNC_SIO)
+        elif self._delay_us == 0:
+            sio_input_bytes(data, len(data), 0)
+        else:
+            # loop内の属性参照を避ける
+            set_io = self.set_io
+            set_web = self.set_web
+            delay = self.delay
+            for i in range(len(data)):
+                set_io(data[i])
+                set_web(0)
+                delay()
+                set_web(1)
+        trace("IO\tDIN\t%dbytes", len(data))
+
+    def output_data(self, num_bytes: int, buf: bytearray | None = None) -> bytearray:
+        # bufを指定した場合はそこへ読み出す (len(buf) == num_bytes)
+        if buf is None:
+            datas = bytearray(num_bytes)
+        else:
+            assert len(buf) == num_bytes
+            datas = buf
         self.set_io_dir(is_output=False)
-        for i in range(num_bytes):
-            self.set_reb(0)
-            self.delay()
-            datas.append(self.get_io())
-            self.set_reb(1)
-            self.delay()
-        trace(f"IO\tDOUT\t{datas.hex()}")
+        if self._use_pio and num_bytes >= PIO_MIN_BYTES:
+            sm = self._sm_dout
+            self.set_gpio_func(self._dout_ctrls, GPIO_FUNC_PIO0)
+            sm.put(num_bytes - 1)
+            sm.get(datas)
+            self.set_gpio_func(self._dout_ctrls, GPIO_FUNC_SIO)
+        elif self._delay_us == 0:
+            sio_output_bytes(datas, num_bytes)
+        else:
+            # loop内の属性参照を避ける
+            set_reb = self.set_reb
+            get_io = self.get_io
+            delay = self.delay
+            for i in range(num_bytes):
+                set_reb(0)
+                delay()
+                datas[i] = get_io()
+                set_reb(1)
+                delay()
+        trace("IO\tDOUT\t%s", LazyHex(datas))
         self.set_io_dir(is_output=True)
         return datas
 
     def wait_busy(self, timeout_ms: int) -> bool:
+        # Read(tR)程度の短いBusyはspinで即応する
+        rbb = self._rbb
+        for _ in range(WAIT_BUSY_SPIN_COUNT):
+            if rbb.value():
+                return True
+        # Erase/Program等の長いBusyはsleepを挟んでpollする
         start = time.ticks_ms()
-        while self.get_rbb() == 0:
+        while rbb.value() == 0:
             if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
                 return False
+            time.sleep_us(WAIT_BUSY_SLEEP_US)
         return True
 
 
@@ -187,11 +455,15 @@ class NandCommander:
     ) -> None:
         self._timeout_ms = timeout_ms
         self._nandio = nandio
+        # Address Cycle用 (コマンド毎に使い回す)
+        self._addr_buf = bytearray(4)
 
     ########################################################
     # Communication functions
     ########################################################
-    def read_id(self, chip_index: int, num_bytes: int = 5) -> bytearray:
+    def read_id(
+        self, chip_index: int, num_bytes: int = 5, buf: bytearray | None = None
+    ) -> bytearray:
         nandio = self._nandio
 
         # initialize
@@ -203,11 +475,11 @@ class NandCommander:
         # Address Input
         nandio.input_addr(0)
         # ID Read
-        id = nandio.output_data(num_bytes=num_bytes)
+        id = nandio.output_data(num_bytes=num_bytes, buf=buf)
         # CS deselect
         nandio.set_ceb(None)
 
-        trace(f"CMD\t{self.read_id.__name__}\tcs={chip_index}\tid={id.hex()}")
+        trace("CMD\tread_id\tcs=%s\tid=%s", chip_index, LazyHex(id))
 
         return id
 
@@ -218,30 +490,129 @@ class NandCommander:
         page: int,
         col: int = 0,
         num_bytes: int = NandConfig.PAGE_ALL_BYTES,
+        buf: bytearray | None = None,
     ) -> bytearray | None:
-        page_addr = NandConfig.create_nand_addr(block=block, page=page, col=col)
+        page_addr = NandConfig.create_nand_addr_into(
+            self._addr_buf, block=block, page=page, col=col
+        )
         nand = self._nandio
         # initialize
         nand.init_pin()
         # CS select
         nand.set_ceb(chip_index=chip_index)
-        # 1st Command Input
-        nand.input_cmd(NandCmd.READ_1ST)
-        # Address Input
-        nand.input_addrs(page_addr)
-        # 2nd Command Input
-        nand.input_cmd(NandCmd.READ_2ND)
+        # 1st Command + Address + 2nd Command Input
+        nand.input_cmd_addrs(NandCmd.READ_1ST, page_addr, NandCmd.READ_2ND)
         # Wait Busy
         is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
         if not is_ok:
-            trace(f"CMD\t{self.read_page.__name__}\ttimeout")
+            trace("CMD\tread_page\ttimeout")
             return None
         # Data Read
-        data = nand.output_data(num_bytes=num_bytes)
+        data = nand.output_data(num_bytes=num_bytes, buf=buf)
         # CS deassert
         nand.set_ceb(None)
         return data
 
+    def scan_first_bytes(
+        self,
+        chip_index: int,
+        blocks: range | list[int],
+        page: int = 0,
+        col: int = 0,
+    ) -> bytearray | None:
+        """各Blockの指定page/colから1byteずつ読み出す (BadBlock Check用)
+        init_pin/CS選択はscan全体で1回だけ行い、Block毎にはRead Commandのみ発行する
+        """
+        nand = self._nandio
+        # page/colは固定なのでcol部分は1回だけ設定する
+        build_addr = NandConfig.make_addr_builder(col, self._addr_buf)
+        datas = bytearray(len(blocks))
+        # Block毎のoutput_dataで確保しないよう、1byteの受け取り先を使い回す
+        data_buf = bytearray(1)
+        # initialize
+        nand.init_pin()
+        # CS select
+        nand.set_ceb(chip_index=chip_index)
+        for i, block in enumerate(blocks):
+            # 1st Command + Address + 2nd Command Input
+            nand.input_cmd_addrs(
+                NandCmd.READ_1ST,
+                build_addr(block, page),
+                NandCmd.READ_2ND,
+            )
+            # Wait Busy
+            is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
+            if not is_ok:
+                trace("CMD\tscan_first_bytes\tblock=%s\ttimeout", block)
+                nand.set_ceb(None)
+                return None
+            # Data Read
+            nand.output_data(num_bytes=1, buf=data_buf)
+            datas[i] = data_buf[0]
+        # CS deassert
+        nand.set_ceb(None)
+        return datas
+
+    def read_page_sequential(
+        self,
+        chip_index: int,
+        block: int,
+        start_page: int,
+        num_pages: int,
+    ) -> list[bytearray] | None:
+        """同一Block内の連続pageを読み出す
+        00h-30hで先頭pageを読み出した後、31h(Read Cache Sequential)で次pageの読み出しと並行してcacheからData Outputを行う
+        最終pageは3Fhで終了する
+        """
+        if start_page + num_pages > NandConfig.PAGES_PER_BLOCK:
+            raise ValueError(
+                f"Invalid Page: {start_page}+{num_pages} (max={NandConfig.PAGES_PER_BLOCK})"
+            )
+        datas: list[bytearray] = []
+        if num_pages <= 0:
+            return datas
+        page_addr = NandConfig.create_nand_addr_into(
+            self._addr_buf, block=block, page=start_page, col=0
+        )
+        nand = self._nandio
+        # initialize
+        nand.init_pin()
+        # CS select
+        nand.set_ceb(chip_index=chip_index)
+        # 1st Command + Address + 2nd Command Input
+        nand.input_cmd_addrs(NandCmd.READ_1ST, page_addr, NandCmd.READ_2ND)
+        # Wait Busy
+        is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
+        if not is_ok:
+            trace("CMD\tread_page_sequential\ttimeout")
+            nand.set_ceb(None)
+            return None
+        for i in range(num_pages):
+            # 読み出し済pageをcacheへ移す (最終page以外は次pageの読み出しも開始する)
+            nand.input_cmd(
+                NandCmd.READ_CACHE_END
+                if i == num_pages - 1
+                else NandCmd.READ_CACHE_SEQUENTIAL
+            )
+            # Wait Busy (cacheへの転送まで)
+            is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
+            if not is_ok:
+                trace("CMD\tread_page_sequential\ttimeout")
+                nand.set_ceb(None)
+                return None
+            # Data Read (cacheから)
+            datas.append(nand.output_data(num_bytes=NandConfig.PAGE_ALL_BYTES))
+        # CS deassert
+        nand.set_ceb(None)
+        trace(
+            "CMD\tread_page_sequential\tcs=%s\tblock=%s\tpage=%s\tnum_pages=%s",
+            chip_index,
+            block,
+            start_page,
+            num_pages,
+        )
+        return datas
+
     def read_status(self, chip_index: int) -> int:
         nand = self._nandio
         # initialize
@@ -256,6 +627,48 @@ class NandCommander:
         nand.set_ceb(None)
         return status[0]
 
+    ########################################################
+    # Non-blocking functions (Commandのみ発行し、完了は*_completeで待つ)
+    ########################################################
+    def read_page_issue(
+        self, chip_index: int, block: int, page: int, col: int = 0
+    ) -> None:
+        """Read Commandを発行し、Busy(tR)解除を待たずに戻る。データはread_page_completeで読み出す"""
+        page_addr = NandConfig.create_nand_addr_into(
+            self._addr_buf, block=block, page=page, col=col
+        )
+        nand = self._nandio
+        # initialize
+        nand.init_pin()
+        # CS select
+        nand.set_ceb(chip_index=chip_index)
+        # 1st Command + Address + 2nd Command Input
+        nand.input_cmd_addrs(NandCmd.READ_1ST, page_addr, NandCmd.READ_2ND)
+        # CS deassert (Busy中のCE#はDon't care)
+        nand.set_ceb(None)
+
+    def read_page_complete(
+        self,
+        chip_index: int,
+        num_bytes: int = NandConfig.PAGE_ALL_BYTES,
+        buf: bytearray | None = None,
+    ) -> bytearray | None:
+        """read_page_issueで発行したReadのBusy解除を待ってデータを読み出す"""
+        nand = self._nandio
+        # CS select
+        nand.set_ceb(chip_index=chip_index)
+        # Wait Busy
+        is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
+        if not is_ok:
+            trace("CMD\tread_page_complete\ttimeout")
+            nand.set_ceb(None)
+            return None
+        # Data Read
+        data = nand.output_data(num_bytes=num_bytes, buf=buf)
+        # CS deassert
+        nand.set_ceb(None)
+        return data
+
     def erase_block(self, chip_index: int, block: int) -> bool:
         block_addr = NandConfig.create_block_addr(block=block)
         nand = self._nandio
@@ -263,26 +676,26 @@ class NandCommander:
         nand.init_pin()
         # CS select
         nand.set_ceb(chip_index=chip_index)
-        # 1st Command Input
-        nand.input_cmd(NandCmd.ERASE_1ST)
-        # Address Input
-        nand.input_addrs(block_addr)
-        # 2nd Command Input
-        nand.input_cmd(NandCmd.ERASE_2ND)
+        # 1st Command + Address + 2nd Command Input
+        nand.input_cmd_addrs(NandCmd.ERASE_1ST, block_addr, NandCmd.ERASE_2ND)
         # Wait Busy
         is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
         if not is_ok:
-            trace(f"CMD\t{self.erase_block.__name__}\ttimeout")
+            trace("CMD\terase_block\ttimeout")
             return False
+        # status read (erase result, CSを保持したまま発行)
+        nand.input_cmd(NandCmd.STATUS_READ)
+        status = nand.output_data(num_bytes=1)[0]
         # CS deassert
         nand.set_ceb(None)
-
-        # status read (erase result)
-        status = self.read_status(chip_index=chip_index)
         is_ok = (status & NandStatus.PROGRAM_ERASE_FAIL) == 0
 
         trace(
-            f"CMD\t{self.erase_block.__name__}\tcs={chip_index}\tblock={block}\tis_ok={is_ok}\tstatus={status:02X}"
+            "CMD\terase_block\tcs=%s\tblock=%s\tis_ok=%s\tstatus=%02X",
+            chip_index,
+            block,
+            is_ok,
+            status,
         )
         return is_ok
 
@@ -294,37 +707,97 @@ class NandCommander:
         data: bytearray,
         col: int = 0,
     ) -> bool:
-        page_addr = NandConfig.create_nand_addr(block=block, page=page, col=col)
+        page_addr = NandConfig.create_nand_addr_into(
+            self._addr_buf, block=block, page=page, col=col
+        )
         nand = self._nandio
         # initialize
         nand.init_pin()
         # CS select
         nand.set_ceb(chip_index=chip_index)
-        # 1st Command Input
-        nand.input_cmd(NandCmd.PROGRAM_1ST)
-        # Address Input
-        nand.input_addrs(page_addr)
+        # 1st Command + Address Input
+        nand.input_cmd_addrs(NandCmd.PROGRAM_1ST, page_addr)
         # Data Input
-        for i in range(len(data)):
-            nand.set_io(data[i])
-            nand.set_web(0)
-            nand.delay()
-            nand.set_web(1)
+        nand.input_data(data)
         # 2nd Command Input
         nand.input_cmd(NandCmd.PROGRAM_2ND)
         # Wait Busy
         is_ok = nand.wait_busy(timeout_ms=self._timeout_ms)
         if not is_ok:
-            trace(f"CMD\t{self.program_page.__name__}\ttimeout")
+            trace("CMD\tprogram_page\ttimeout")
             return False
+        # status read (program result, CSを保持したまま発行)
+        nand.input_cmd(NandCmd.STATUS_READ)
+        status = nand.output_data(num_bytes=1)[0]
         # CS deassert
         nand.set_ceb(None)
-
-        # status read (program result)
-        status = self.read_status(chip_index=chip_index)
         is_ok = (status & NandStatus.PROGRAM_ERASE_FAIL) == 0
 
         trace(
-            f"CMD\t{self.program_page.__name__}\tcs={chip_index}\tblock={block}\tpage={page}\tis_ok={is_ok}\tstatus={status:02X}"
+            "CMD\tprogram_page\tcs=%s\tblock=%s\tpage=%s\tis_ok=%s\tstatus=%02X",
+            chip_index,
+            block,
+            page,
+            is_ok,
+            status,
+        )
+        return is_ok
+
+    def program_sequence(
+        self,
+        chip_index: int,
+        block: int,
+        start_page: int,
+        pages: list[bytearray],
+    ) -> bool:
+        """同一Block内の連続pageを書き込む
+        最終page以外はCache Program(15h)で発行し、前pageのProgram中に次pageのData Inputを行う
+        """
+        nand = self._nandio
+        build_addr = NandConfig.make_addr_builder(0, self._addr_buf)
+        num_pages = len(pages)
+        # initialize
+        nand.init_pin()
+        # CS select
+        nand.set_ceb(chip_index=chip_index)
+        is_ok = True
+        status = 0
+        for i in range(num_pages):
+            is_last = i == num_pages - 1
+            page_addr = build_addr(block, start_page + i)
+            # 1st Command + Address Input
+            nand.input_cmd_addrs(NandCmd.PROGRAM_1ST, page_addr)
+            # Data Input
+            nand.input_data(pages[i])
+            # 2nd Command Input (最終pageのみ通常Program)
+            nand.input_cmd(
+                NandCmd.PROGRAM_2ND if is_last else NandCmd.CACHE_PROGRAM_2ND
+            )
+            # Wait Busy (Cache Programの場合はcache空きまで)
+            if not nand.wait_busy(timeout_ms=self._timeout_ms):
+                trace("CMD\tprogram_sequence\ttimeout")
+                nand.set_ceb(None)
+                return False
+            # status read (CACHE_PROGRAM_FAILは1つ前のpageの結果。先頭pageでは本sequence外のpageを指すので見ない)
+            nand.input_cmd(NandCmd.STATUS_READ)
+            status = nand.output_data(num_bytes=1)[0]
+            if i > 0 and (status & NandStatus.CACHE_PROGRAM_FAIL):
+                trace("CMD\tprogram_sequence\tpage=%s\tfailed", start_page + i - 1)
+                is_ok = False
+        # CS deassert
+        nand.set_ceb(None)
+        # 最終page(10h)の結果は最後のstatusのPROGRAM_ERASE_FAIL
+        if status & NandStatus.PROGRAM_ERASE_FAIL:
+            trace("CMD\tprogram_sequence\tpage=%s\tfailed", start_page + num_pages - 1)
+            is_ok = False
+
+        trace(
+            "CMD\tprogram_sequence\tcs=%s\tblock=%s\tpage=%s\tnum_pages=%s\tis_ok=%s\tstatus=%02X",
+            chip_index,
+            block,
+            start_page,
+            num_pages,
+            is_ok,
+            status,
         )
         return is_ok
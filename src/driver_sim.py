@@ -1,12 +1,20 @@
 import os
+from collections import OrderedDict
 from log import error, trace, debug, info, LogLevel
-from nand import NandConfig
+from nand import NandConfig, NandStatus
 
 
 class NandIo:
     def __init__(self, keep_wp: bool = True) -> None:
         # VCD traceしたくなった場合は実装
-        pass
+        self._keep_wp = keep_wp
+
+    @property
+    def keep_wp(self) -> bool:
+        return self._keep_wp
+
+    def set_keep_wp(self, keep_wp: bool) -> None:
+        self._keep_wp = keep_wp
 
 
 class NandCommander:
@@ -16,13 +24,19 @@ class NandCommander:
         num_chip: int = 1,
         base_dir: str | None = "nand_datas",
         ram_cache: bool = False,
+        max_open_files: int = 64,
     ) -> None:
         self._nandio = nandio
         self._num_chip = num_chip
         self._base_dir = base_dir
         self._ram_cache = ram_cache
-        # chip -> block -> page -> data
-        self._ram_cache_data: dict[int, dict[int, dict[int, bytearray]]] = dict()
+        # (chip, block) を詰めたkey -> Block全pageを連続配置したslab (使用したBlockのみ確保)
+        self._ram_cache_slabs: dict[int, bytearray] = dict()
+        # path -> file (open/closeを毎回行わないよう、最近使ったものを開いたまま保持する)
+        self._max_open_files = max_open_files
+        self._open_files: OrderedDict = OrderedDict()
+        # CS -> read_page_issueで発行済の(block, page, col)
+        self._issued_reads: dict[int, tuple[int, int, int]] = dict()
 
         if base_dir is not None:
             # os.pathが無いのでとりあえず試す
@@ -36,8 +50,9 @@ class NandCommander:
             except OSError as e:
                 error(f"Failed to stat directory: {base_dir} error={e}")
                 raise e
+            self._migrate_page_files()
 
-    def _data_path(self, chip_index: int, block: int, page: int) -> str:
+    def _data_path(self, chip_index: int, block: int) -> str:
         # check range
         if chip_index >= self._num_chip:
             raise ValueError(
@@ -45,77 +60,163 @@ class NandCommander:
             )
         if block >= NandConfig.BLOCKS_PER_CS:
             raise ValueError(f"Invalid Block: {block} (max={NandConfig.BLOCKS_PER_CS})")
-        if page >= NandConfig.PAGES_PER_BLOCK:
-            raise ValueError(f"Invalid Page: {page} (max={NandConfig.PAGES_PER_BLOCK})")
 
-        return (
-            f"{self._base_dir}/cs{chip_index:02d}_block{block:04d}_page{page:02d}.bin"
-        )
+        # 1Block 1file (page * PAGE_ALL_BYTES の位置に各pageを配置)
+        return f"{self._base_dir}/cs{chip_index:02d}_block{block:04d}.bin"
 
-    def _update_ram_cache(
-        self, chip_index: int, block: int, page: int, data: bytearray
-    ) -> None:
-        if chip_index not in self._ram_cache_data:
-            self._ram_cache_data[chip_index] = dict()
-        if block not in self._ram_cache_data[chip_index]:
-            self._ram_cache_data[chip_index][block] = dict()
-        self._ram_cache_data[chip_index][block][page] = data
-
-    def _read_data(self, chip_index: int, block: int, page: int) -> bytearray | None:
-        # read cache
-        if self._ram_cache and chip_index in self._ram_cache_data:
-            if block in self._ram_cache_data[chip_index]:
-                if page in self._ram_cache_data[chip_index][block]:
-                    return self._ram_cache_data[chip_index][block][page]
+    def _migrate_page_files(self) -> None:
+        """旧形式(1page 1file: cs{NN}_block{NNNN}_page{NN}.bin)のdataを1Block 1fileへ移す"""
+        num_migrated = 0
+        num_ignored = 0
+        for name in os.listdir(self._base_dir):
+            if len(name) != 25 or name[14:19] != "_page" or not name.endswith(".bin"):
+                continue
+            old_path = f"{self._base_dir}/{name}"
+            try:
+                chip_index = int(name[2:4])
+                block = int(name[10:14])
+                page = int(name[19:21])
+                with open(old_path, "rb") as f:
+                    data = f.read()
+                self._write_data(
+                    chip_index=chip_index, block=block, page=page, data=data
+                )
+            except ValueError as e:
+                # 範囲外のCS/Block/Pageなど。fileは残しておく
+                error(f"Ignored old page file: {old_path} error={e}")
+                num_ignored += 1
+                continue
+            os.remove(old_path)
+            num_migrated += 1
+        if num_migrated > 0 or num_ignored > 0:
+            info(
+                f"Migrated old page files: migrated={num_migrated} ignored={num_ignored}"
+            )
 
-        if self._base_dir is None:
-            dst = bytearray([0xFF] * NandConfig.PAGE_ALL_BYTES)
-            # cache to ram
-            if self._ram_cache:
-                self._update_ram_cache(chip_index, block, page, dst)
-            return dst
-        else:
+    def _open_file(self, path: str, create: bool):
+        # 末尾が最近使ったもの
+        f = self._open_files.pop(path, None)
+        if f is None:
+            try:
+                f = open(path, "r+b")
+            except OSError as e:
+                if not create:
+                    raise e
+                # 空fileで作成 (未書き込み部分は読み出し時に消去状態として扱う)
+                f = open(path, "w+b")
+            if len(self._open_files) >= self._max_open_files:
+                oldest = next(iter(self._open_files))
+                self._open_files.pop(oldest).close()
+        self._open_files[path] = f
+        return f
+
+    def close(self) -> None:
+        for f in self._open_files.values():
+            f.close()
+        self._open_files.clear()
+
+    @staticmethod
+    def _cache_key(chip_index: int, block: int) -> int:
+        # | chip | block[9:0] |
+        return (chip_index << NandConfig.BLOCK_BITS) | block
+
+    def _load_data(
+        self,
+        chip_index: int,
+        block: int,
+        dst: bytearray | memoryview,
+        offset: int = 0,
+    ) -> None:
+        """Block fileのoffsetからdstの長さ分を読み出す"""
+        num_bytes = 0
+        if self._base_dir is not None:
             # from file
-            path = self._data_path(chip_index=chip_index, block=block, page=page)
+            path = self._data_path(chip_index=chip_index, block=block)
             try:
-                with open(path, "rb") as f:
-                    dst = bytearray(f.read())
-                    # cache to ram
-                    if self._ram_cache:
-                        self._update_ram_cache(chip_index, block, page, dst)
-                    return dst
+                f = self._open_file(path, create=False)
+            except OSError:
+                # fileが無いBlockは消去状態
+                f = None
+            if f is not None:
+                try:
+                    f.seek(offset)
+                    num_bytes = f.readinto(dst)
+                except OSError as e:
+                    error(f"Failed to read file: {path} error={e}")
+        if num_bytes is None or num_bytes < len(dst):
+            # 未書き込み部分は消去状態
+            num_bytes = num_bytes if num_bytes else 0
+            dst[num_bytes:] = b"\xff" * (len(dst) - num_bytes)
 
-            except OSError as e:
-                error(f"Failed to read file: {path} error={e}")
-                return bytearray([0xFF] * NandConfig.PAGE_ALL_BYTES)
+    def _ram_cache_slab(self, chip_index: int, block: int) -> memoryview:
+        key = self._cache_key(chip_index, block)
+        slab = self._ram_cache_slabs.get(key)
+        if slab is None:
+            # 初回はBlock全体をまとめて読み込む
+            slab = bytearray(NandConfig.BLOCK_ALL_BYTES)
+            self._load_data(chip_index, block, slab)
+            self._ram_cache_slabs[key] = slab
+        return memoryview(slab)
+
+    def _read_data(
+        self, chip_index: int, block: int, page: int
+    ) -> bytearray | memoryview | None:
+        if page >= NandConfig.PAGES_PER_BLOCK:
+            raise ValueError(f"Invalid Page: {page} (max={NandConfig.PAGES_PER_BLOCK})")
+        offset = page * NandConfig.PAGE_ALL_BYTES
+        if self._ram_cache:
+            # read cache (slab上のviewを返す)
+            slab = self._ram_cache_slab(chip_index, block)
+            return slab[offset : offset + NandConfig.PAGE_ALL_BYTES]
+        else:
+            dst = bytearray(NandConfig.PAGE_ALL_BYTES)
+            self._load_data(chip_index, block, dst, offset)
+            return dst
 
     def _write_data(
         self, chip_index: int, block: int, page: int, data: bytearray
     ) -> None:
+        if page >= NandConfig.PAGES_PER_BLOCK:
+            raise ValueError(f"Invalid Page: {page} (max={NandConfig.PAGES_PER_BLOCK})")
+        offset = page * NandConfig.PAGE_ALL_BYTES
         # cache to ram
         if self._ram_cache:
-            self._update_ram_cache(chip_index, block, page, data)
+            slab = self._ram_cache_slab(chip_index, block)
+            slab[offset : offset + len(data)] = data
 
         if self._base_dir is None:
             # do nothing
             return
         else:
             # to file
-            path = self._data_path(chip_index=chip_index, block=block, page=page)
+            path = self._data_path(chip_index=chip_index, block=block)
             try:
-                with open(path, "wb") as f:
-                    f.write(data)
+                f = self._open_file(path, create=True)
+                # 末尾より先に書く場合は間を消去状態で埋める
+                end = f.seek(0, 2)
+                if end < offset:
+                    f.write(b"\xff" * (offset - end))
+                else:
+                    f.seek(offset)
+                f.write(data)
+                f.flush()
             except OSError as e:
                 error(f"Failed to write file: {path} error={e}")
 
     ########################################################
     # Communication functions
     ########################################################
-    def read_id(self, chip_index: int, num_bytes: int = 5) -> bytearray:
+    def read_id(
+        self, chip_index: int, num_bytes: int = 5, buf: bytearray | None = None
+    ) -> bytearray:
         if chip_index < self._num_chip:
-            return NandConfig.READ_ID_EXPECT
+            id = NandConfig.READ_ID_EXPECT
         else:
-            return bytearray([0x00] * num_bytes)
+            id = bytearray(num_bytes)
+        if buf is not None:
+            buf[:num_bytes] = id[:num_bytes]
+            return buf
+        return id
 
     def read_page(
         self,
@@ -124,23 +225,108 @@ class NandCommander:
         page: int,
         col: int = 0,
         num_bytes: int = NandConfig.PAGE_ALL_BYTES,
+        buf: bytearray | None = None,
     ) -> bytearray | None:
         data = self._read_data(chip_index=chip_index, block=block, page=page)
+        if buf is not None and data is not None:
+            buf[:num_bytes] = data[col : col + num_bytes]
+            return buf
         return data
 
+    def read_page_sequential(
+        self,
+        chip_index: int,
+        block: int,
+        start_page: int,
+        num_pages: int,
+    ) -> list[bytearray] | None:
+        if start_page + num_pages > NandConfig.PAGES_PER_BLOCK:
+            raise ValueError(
+                f"Invalid Page: {start_page}+{num_pages} (max={NandConfig.PAGES_PER_BLOCK})"
+            )
+        datas = []
+        for page in range(start_page, start_page + num_pages):
+            data = self._read_data(chip_index=chip_index, block=block, page=page)
+            if data is None:
+                return None
+            datas.append(data)
+        return datas
+
+    def scan_first_bytes(
+        self,
+        chip_index: int,
+        blocks: range | list[int],
+        page: int = 0,
+        col: int = 0,
+    ) -> bytearray | None:
+        datas = bytearray(len(blocks))
+        for i, block in enumerate(blocks):
+            data = self._read_data(chip_index=chip_index, block=block, page=page)
+            if data is None:
+                return None
+            datas[i] = data[col]
+        return datas
+
     def read_status(self, chip_index: int) -> int:
-        return 0x00
+        # 常にReady (Erase/Programは発行時に完了している)
+        return NandStatus.PAGE_BUFFER_READY | NandStatus.DATA_CACHE_READY
 
-    def erase_block(self, chip_index: int, block: int) -> bool:
-        self._write_data(
+    def program_sequence(
+        self,
+        chip_index: int,
+        block: int,
+        start_page: int,
+        pages: list[bytearray],
+    ) -> bool:
+        is_ok = True
+        for i, data in enumerate(pages):
+            is_ok = (
+                self.program_page(
+                    chip_index=chip_index, block=block, page=start_page + i, data=data
+                )
+                and is_ok
+            )
+        return is_ok
+
+    def read_page_issue(
+        self, chip_index: int, block: int, page: int, col: int = 0
+    ) -> None:
+        self._issued_reads[chip_index] = (block, page, col)
+
+    def read_page_complete(
+        self,
+        chip_index: int,
+        num_bytes: int = NandConfig.PAGE_ALL_BYTES,
+        buf: bytearray | None = None,
+    ) -> bytearray | None:
+        issued = self._issued_reads.pop(chip_index, None)
+        if issued is None:
+            error(f"Read not issued: cs={chip_index}")
+            return None
+        block, page, col = issued
+        return self.read_page(
             chip_index=chip_index,
             block=block,
-            page=0,
-            data=bytearray([0xFF] * NandConfig.PAGE_ALL_BYTES),
-        )
-        trace(
-            f"CMD\t{self.erase_block.__name__}\tcs={chip_index}\tblock={block}\tis_ok=True"
+            page=page,
+            col=col,
+            num_bytes=num_bytes,
+            buf=buf,
         )
+
+    def erase_block(self, chip_index: int, block: int) -> bool:
+        # Block全体(全page)を消去状態にする (slab/fileを破棄し、次回読み出し時に消去状態として扱う)
+        self._ram_cache_slabs.pop(self._cache_key(chip_index, block), None)
+        if self._base_dir is not None:
+            path = self._data_path(chip_index=chip_index, block=block)
+            f = self._open_files.pop(path, None)
+            if f is not None:
+                f.close()
+            try:
+                os.remove(path)
+            except OSError:
+                # 未書き込みのBlock
+                pass
+        trace("CMD\terase_block\tcs=%s\tblock=%s\tis_ok=True", chip_index, block)
         return True
 
     def program_page(
@@ -153,6 +339,9 @@ class NandCommander:
     ) -> bool:
         self._write_data(chip_index=chip_index, block=block, page=page, data=data)
         trace(
-            f"CMD\t{self.program_page.__name__}\tcs={chip_index}\tblock={block}\tpage={page}\tis_ok=True"
+            "CMD\tprogram_page\tcs=%s\tblock=%s\tpage=%s\tis_ok=True",
+            chip_index,
+            block,
+            page,
         )
         return True
@@ -1,3 +1,4 @@
+import sys
 import time
 
 
@@ -9,18 +10,13 @@ class LogLevel:
     DEBUG = 3
     TRACE = 4
 
+    # index = level
+    _NAMES = ("ERROR", "WARN", "INFO", "DEBUG", "TRACE")
+
     @classmethod
     def to_str(cls, level: int) -> str:
-        if level == cls.ERROR:
-            return "ERROR"
-        elif level == cls.WARN:
-            return "WARN"
-        elif level == cls.INFO:
-            return "INFO"
-        elif level == cls.DEBUG:
-            return "DEBUG"
-        elif level == cls.TRACE:
-            return "TRACE"
+        if 0 <= level < len(cls._NAMES):
+            return cls._NAMES[level]
         else:
             return "UNKNOWN"
 
@@ -29,9 +25,70 @@ class LogLevel:
 CURRENT_LOG_LEVEL = LogLevel.TRACE
 
 
+# log()から直接参照する (to_strの呼び出しを省略)
+_LEVEL_NAMES = LogLevel._NAMES
+
+# 出力バッファ (TRACE/DEBUGはprint毎に出力せず、まとめてstdoutへ書き出す)
+LOG_BUF_BYTES = 8192
+LOG_FLUSH_THRESHOLD = 7168
+_log_buf = bytearray(LOG_BUF_BYTES)
+_log_mv = memoryview(_log_buf)
+_log_pos = 0
+
+
+def flush() -> None:
+    global _log_pos
+    if _log_pos > 0:
+        # memoryviewから直接decodeする (bytesへの中間copyを省略)
+        sys.stdout.write(str(_log_mv[:_log_pos], "utf-8"))
+        _log_pos = 0
+
+
+def _flush_on_exit(*args) -> None:
+    flush()
+
+
+def _excepthook(exc_type, exc, tb) -> None:
+    # traceback出力前に、溜まっているTRACE/DEBUGを書き出しておく
+    flush()
+    _default_excepthook(exc_type, exc, tb)
+
+
+# 未処理例外/終了時にバッファを失わないよう登録する (portによって提供されていないものは省略)
+if hasattr(sys, "excepthook"):
+    _default_excepthook = sys.excepthook
+    sys.excepthook = _excepthook
+if hasattr(sys, "atexit"):
+    # MicroPython
+    sys.atexit(_flush_on_exit)
+else:
+    try:
+        import atexit
+
+        atexit.register(_flush_on_exit)
+    except ImportError:
+        pass
+
+
 def log(level: int, msg: str) -> None:
+    global _log_pos
     if level <= CURRENT_LOG_LEVEL:
-        print(f"[{time.ticks_us()}][{LogLevel.to_str(level)}]{msg}")
+        # 範囲外のlevelはLogLevel.to_strと同様に"UNKNOWN"とする
+        name = _LEVEL_NAMES[level] if 0 <= level < len(_LEVEL_NAMES) else "UNKNOWN"
+        line = f"[{time.ticks_us()}][{name}]{msg}\n"
+        data = line.encode()
+        num_bytes = len(data)
+        if _log_pos + num_bytes > LOG_BUF_BYTES:
+            flush()
+        if num_bytes > LOG_BUF_BYTES:
+            # バッファに収まらないものは直接出力
+            sys.stdout.write(line)
+        else:
+            _log_mv[_log_pos : _log_pos + num_bytes] = data
+            _log_pos += num_bytes
+        # INFO以上は即時出力 (それまでのTRACE/DEBUGも順序を保って出力される)
+        if level <= LogLevel.INFO or _log_pos > LOG_FLUSH_THRESHOLD:
+            flush()
     else:
         pass
 
@@ -52,5 +109,20 @@ def debug(msg: str) -> None:
     log(LogLevel.DEBUG, msg)
 
 
-def trace(msg: str) -> None:
+class LazyHex:
+    """trace()の引数用。TRACE無効時に.hex()の変換を行わないよう、整形時まで遅延する"""
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        self._data = data
+
+    def __str__(self) -> str:
+        return self._data.hex()
+
+
+def trace(msg: str, *args) -> None:
+    """argsを指定した場合は msg % args で整形する (TRACE無効時は整形自体を行わない)"""
+    if LogLevel.TRACE > CURRENT_LOG_LEVEL:
+        return
+    if args:
+        msg = msg % args
     log(LogLevel.TRACE, msg)
@@ -1,36 +1,151 @@
+import struct
+from array import array
 from log import error, warn, trace, debug, info, LogLevel
+from log import flush as log_flush
 from nand import NandConfig, NandBlockManager, PageCodec, get_driver, PBA
 
 # Logical Block Address
 LBA = int
 
+# 未割当LBAの読み出し結果 (immutableなので共有して返す)
+_ZERO_SECTOR: bytes = bytes(NandConfig.SECTOR_BYTES)
+
+# hot pathで参照する定数 (NandConfigは動作中に変化しないのでimport時にmodule変数へ展開)
+_SECTOR_BYTES = NandConfig.SECTOR_BYTES
+_SECTOR_MASK = NandConfig.SECTOR_MASK
+# PBAのうちBlock内のpage/sectorを示すbit (全bit 0でBlock先頭)
+_BLOCK_OFFSET_MASK = (1 << (NandConfig.PAGE_BITS + NandConfig.SECTOR_BITS)) - 1
+
 
 class Mapping:
-    """LBAとPBAのマッピングを管理するクラス"""
+    """LBAとPBAのマッピングを管理するクラス
 
-    def __init__(self) -> None:
-        self.l2p: dict[LBA, PBA] = dict()
+    note: 全LBA分を1つのarrayで確保すると 4byte x NUM_LBA (=2MiB) となりRP2040のRAMに載らないため、
+          MAP_CHUNK_ENTRIES 単位のarrayに分割し、書き込みがあった範囲のみ確保する
+    """
+
+    # 未割当を示すPBA
+    UNMAPPED = 0xFFFFFFFF
+    # 1chunkあたりのLBA数 (2^10 = 1024 entries = 4KiB)
+    MAP_CHUNK_BITS = 10
+    MAP_CHUNK_ENTRIES = 1 << MAP_CHUNK_BITS
+    MAP_CHUNK_MASK = MAP_CHUNK_ENTRIES - 1
+    # save/load file format
+    MAGIC = b"L2PM"
+    VERSION = 1
+    HEADER_FORMAT = "<4sIII"
+
+    def __init__(self, num_lba: int = NandConfig.NUM_LBA) -> None:
+        self.num_lba = num_lba
+        # chunk index -> array('I') (未確保はNone)
+        self.l2p: list[array | None] = [None] * (
+            (num_lba + _MAP_CHUNK_MASK) >> _MAP_CHUNK_BITS
+        )
+
+    def is_valid(self, lba: LBA) -> bool:
+        """LBAが範囲内か"""
+        return 0 <= lba < self.num_lba
+
+    def _get(self, lba: LBA) -> PBA | None:
+        # 範囲外のLBAは未割当として扱う
+        if not self.is_valid(lba):
+            return None
+        chunk = self.l2p[lba >> _MAP_CHUNK_BITS]
+        if chunk is None:
+            return None
+        pba = chunk[lba & _MAP_CHUNK_MASK]
+        return None if pba == _UNMAPPED else pba
 
     def resolve(self, lba: LBA) -> PBA | None:
         """LBA -> PBAの変換"""
-        pba = self.l2p.get(lba)
-        trace(f"MAP\tresolve\tLBA={lba}\tPBA={pba}")
+        pba = self._get(lba)
+        trace("MAP\tresolve\tLBA=%s\tPBA=%s", lba, pba)
         return pba
 
     def update(self, lba: LBA, pba: PBA) -> None:
         """LBA -> PBAの割当更新"""
-        trace(f"MAP\tupdate\tLBA={lba}\tPBA={self.l2p.get(lba)}->{pba}")
-        self.l2p[lba] = pba
+        if not self.is_valid(lba):
+            raise ValueError(f"Invalid LBA: {lba} (max={self.num_lba})")
+        trace("MAP\tupdate\tLBA=%s\tPBA=%s->%s", lba, self._get(lba), pba)
+        chunk_index = lba >> _MAP_CHUNK_BITS
+        chunk = self.l2p[chunk_index]
+        if chunk is None:
+            # 初回書き込み時にchunkを確保
+            chunk = array("I", [_UNMAPPED] * _MAP_CHUNK_ENTRIES)
+            self.l2p[chunk_index] = chunk
+        chunk[lba & _MAP_CHUNK_MASK] = pba
 
     def unmap(self, lba: LBA) -> None:
         """LBAのマッピング削除"""
-        trace(f"MAP\tunmap\tLBA={lba}\tPBA={self.l2p.get(lba)}")
-        self.l2p.pop(lba, None)
+        trace("MAP\tunmap\tLBA=%s\tPBA=%s", lba, self._get(lba))
+        if not self.is_valid(lba):
+            return
+        chunk = self.l2p[lba >> _MAP_CHUNK_BITS]
+        if chunk is not None:
+            chunk[lba & _MAP_CHUNK_MASK] = _UNMAPPED
+
+    def save(self, filepath: str = "l2p_mapping.bin") -> None:
+        """確保済のchunkのみを binary で保存する
+
+        | offset | Data                                                  |
+        |--------|-------------------------------------------------------|
+        | 0      | header: magic[4], version, num_lba, num_chunks (u32)  |
+        | 16     | chunk_index (u32) + array('I') (4byte x 1024) x num_chunks |
+        """
+        chunks = [(i, chunk) for i, chunk in enumerate(self.l2p) if chunk is not None]
+        f = open(filepath, "wb")
+        try:
+            f.write(
+                struct.pack(
+                    Mapping.HEADER_FORMAT,
+                    Mapping.MAGIC,
+                    Mapping.VERSION,
+                    self.num_lba,
+                    len(chunks),
+                )
+            )
+            for chunk_index, chunk in chunks:
+                f.write(struct.pack("<I", chunk_index))
+                f.write(chunk)
+        finally:
+            f.close()
+        trace("MAP\tsave\t%s\tnum_chunks=%s", filepath, len(chunks))
+
+    def load(self, filepath: str = "l2p_mapping.bin") -> None:
+        """saveで保存したbinaryを読み込む"""
+        f = open(filepath, "rb")
+        try:
+            header = f.read(struct.calcsize(Mapping.HEADER_FORMAT))
+            magic, version, num_lba, num_chunks = struct.unpack(
+                Mapping.HEADER_FORMAT, header
+            )
+            if magic != Mapping.MAGIC or version != Mapping.VERSION:
+                raise ValueError(f"Invalid Mapping File: {filepath}")
+            self.num_lba = num_lba
+            self.l2p = [None] * ((num_lba + _MAP_CHUNK_MASK) >> _MAP_CHUNK_BITS)
+            for _ in range(num_chunks):
+                (chunk_index,) = struct.unpack("<I", f.read(4))
+                chunk = array("I", [_UNMAPPED] * _MAP_CHUNK_ENTRIES)
+                f.readinto(chunk)
+                self.l2p[chunk_index] = chunk
+        finally:
+            f.close()
+        trace("MAP\tload\t%s\tnum_chunks=%s", filepath, num_chunks)
+
+
+# Mapping内で参照する定数 (クラス属性の参照を省略)
+_UNMAPPED = Mapping.UNMAPPED
+_MAP_CHUNK_BITS = Mapping.MAP_CHUNK_BITS
+_MAP_CHUNK_ENTRIES = Mapping.MAP_CHUNK_ENTRIES
+_MAP_CHUNK_MASK = Mapping.MAP_CHUNK_MASK
 
 
 class FlashTranslationLayer:
     """Flash Translation Layer (FTL)"""
 
+    # Encode済pageをこの数だけ溜めてからまとめてProgramする
+    FLUSH_BATCH = 8
+
     def __init__(self) -> None:
         # NAND Drivers
         self.nandio, self.nandcmd = get_driver(keep_wp=False)
@@ -42,23 +157,45 @@ class FlashTranslationLayer:
         self.mapping = Mapping()
 
         # Write Buffer (WriteはEncode都合でpage単位で行うため、複数sector束ねる用)
-        self.write_buffer: bytearray = bytearray([0x0] * NandConfig.PAGE_USABLE_BYTES)
-        # write buffer 上にあるLBA (有効なsector数を求める目的と、Write Buffer城のデータを返却するケースで使用)
-        self.write_buffer_lbas: list[LBA] = list()
+        self.write_buffer: bytearray = bytearray(NandConfig.PAGE_USABLE_BYTES)
+        self._wbuf_mv = memoryview(self.write_buffer)
+        # write buffer 上にあるLBA (index = sector。page毎に先頭から上書きするので再確保しない)
+        self.write_buffer_lbas: array = array("I", [0] * NandConfig.SECTOR_PER_PAGE)
+        # write buffer 上のLBA -> sector位置 (read時の検索用。同一LBAの再書き込みは後勝ち)
+        self.write_buffer_lba_to_slot: dict[LBA, int] = dict()
+        # write_page用のEncode先 (即時Programするので使い回す)
+        self.encode_buffer: bytearray = bytearray(NandConfig.PAGE_ALL_BYTES)
+        # 最後にdecodeしたpage (同一page内のsectorを続けて読む場合にNAND Read/decodeを省略する)
+        self._last_page_key: PBA | None = None
+        self._last_page_data: bytes | None = None
+        # Program待ちのEncode済page (chip, block, page, data)
+        self.page_queue: list[tuple[int, int, int, bytearray]] = list()
+        # page_queue上のpage(sector=0のPBA) -> queue位置 (read時の検索用)
+        self.page_queue_pba_to_slot: dict[PBA, int] = dict()
         # 現在の書き込み進捗
-        self.current_write_chip: int | None = None
-        self.current_write_block: int | None = None
-        self.current_write_page: int | None = None
-        self.current_write_sector: int | None = None
+        # 次に書き込むPBA (None: 書き込み先Block未確保)。sectorが最下位bitなので+1で次のsector/pageへ進む
+        self.current_write_pba: PBA | None = None
+        # Write Buffer上の各sectorのslice範囲
+        sb = NandConfig.SECTOR_BYTES
+        self._write_slices: tuple[tuple[int, int], ...] = tuple(
+            (i * sb, (i + 1) * sb) for i in range(NandConfig.SECTOR_PER_PAGE)
+        )
 
     ########################################################
     # Physical Address Read
     ########################################################
 
-    def read_page(self, chip_index: int, block: int, page: int) -> bytearray | None:
-        """指定されたページをすべて読み出し"""
-        # データを読み込む
-        page_data = self.blockmng.read(chip_index, block, page)
+    def read_page(self, chip_index: int, block: int, page: int) -> bytes | None:
+        """指定されたページをすべて読み出し (cacheと共有するので書き換え不可のbytesを返す)"""
+        # 直前にdecodeしたpageであれば再利用する
+        page_key = NandConfig.encode_phys_addr(chip_index, block, page, 0)
+        if page_key == self._last_page_key:
+            return self._last_page_data
+        # Program待ちのpageはqueueから読み出す
+        page_data = self.find_queued_page(chip_index, block, page)
+        if page_data is None:
+            # データを読み込む
+            page_data = self.blockmng.read(chip_index, block, page)
         if page_data is None:
             debug(
                 f"FTL\tread_page\tcs={chip_index}\tblock={block}\tpage={page}\tnot found"
@@ -71,19 +208,82 @@ class FlashTranslationLayer:
                 f"FTL\tread_page\tcs={chip_index}\tblock={block}\tpage={page}\tdecode failed"
             )
             return None
+        # 呼び出し側で書き換えられてもcacheが壊れないようbytesで保持する
+        decode_page_data = bytes(decode_page_data)
+        self._last_page_key = page_key
+        self._last_page_data = decode_page_data
         return decode_page_data
 
+    def invalidate_page_cache(self, chip_index: int, block: int, page: int) -> None:
+        """書き込み対象のpageがdecode済cacheに残っていれば破棄する"""
+        if self._last_page_key == NandConfig.encode_phys_addr(
+            chip_index, block, page, 0
+        ):
+            self._last_page_key = None
+            self._last_page_data = None
+
+    def read_pages(self, pages: list[tuple[int, int, int]]) -> list[bytes | None]:
+        """(chip, block, page) のlistを順に読み出し、decode結果(失敗時None)のlistを返す
+        decode済cache/Program待ちqueueにあるpageはそちらを使い、残りはNAND Readを前pageのdecode中に進めておく
+        発行したReadは戻るまでにすべて完了させる
+        """
+        results: list[bytes | None] = [None] * len(pages)
+        # NANDから読み出すpageのindex
+        pending: list[int] = list()
+        for i, (chip_index, block, page) in enumerate(pages):
+            page_key = NandConfig.encode_phys_addr(chip_index, block, page, 0)
+            if page_key == self._last_page_key:
+                results[i] = self._last_page_data
+                continue
+            queued = self.find_queued_page(chip_index, block, page)
+            if queued is not None:
+                results[i] = self._decode_page(queued, chip_index, block, page)
+                continue
+            pending.append(i)
+        if len(pending) == 0:
+            return results
+
+        # 受け取ったpageはdecodeしてから次を受け取るので、bufferは1面で足りる
+        raw_buffer = bytearray(NandConfig.PAGE_ALL_BYTES)
+        chip_index, block, page = pages[pending[0]]
+        self.blockmng.read_issue(chip_index, block, page)
+        for j, i in enumerate(pending):
+            chip_index, block, page = pages[i]
+            page_data = self.blockmng.read_complete(chip_index, buf=raw_buffer)
+            # 次pageのReadを発行してからdecodeする
+            if j + 1 < len(pending):
+                next_chip, next_block, next_page = pages[pending[j + 1]]
+                self.blockmng.read_issue(next_chip, next_block, next_page)
+            if page_data is None:
+                debug(
+                    f"FTL\tread_pages\tcs={chip_index}\tblock={block}\tpage={page}\tnot found"
+                )
+                continue
+            results[i] = self._decode_page(page_data, chip_index, block, page)
+        return results
+
+    def _decode_page(
+        self, page_data: bytearray | memoryview, chip_index: int, block: int, page: int
+    ) -> bytes | None:
+        decode_page_data = self.codec.decode(page_data)
+        if decode_page_data is None:
+            debug(
+                f"FTL\tread_pages\tcs={chip_index}\tblock={block}\tpage={page}\tdecode failed"
+            )
+            return None
+        return bytes(decode_page_data)
+
     def read_sector(
         self, chip_index: int, block: int, page: int, sector: int
-    ) -> bytearray | None:
+    ) -> memoryview | None:
         """指定されたページのセクタを読み出し"""
         # データを読み込む
         page_data = self.read_page(chip_index, block, page)
         if page_data is None:
             return None
-        # ほしいSectorを取得
-        sector_data = page_data[
-            sector * NandConfig.SECTOR_BYTES : (sector + 1) * NandConfig.SECTOR_BYTES
+        # ほしいSectorを取得 (read_pageはbytesを返すので、copyせず読み出し専用のviewを返す)
+        sector_data = memoryview(page_data)[
+            sector * _SECTOR_BYTES : (sector + 1) * _SECTOR_BYTES
         ]
         return sector_data
 
@@ -95,8 +295,9 @@ class FlashTranslationLayer:
         self, chip_index: int, block: int, page: int, data: bytearray
     ) -> bool:
         """指定されたページを書き込む"""
+        self.invalidate_page_cache(chip_index, block, page)
         # データをエンコード
-        encode_page_data = self.codec.encode(data)
+        encode_page_data = self.codec.encode(data, out=self.encode_buffer)
         if encode_page_data is None:
             debug(
                 f"FTL\twrite_page\tcs={chip_index}\tblock={block}\tpage={page}\tencode failed"
@@ -111,27 +312,68 @@ class FlashTranslationLayer:
             return False
         return True
 
+    def find_queued_page(
+        self, chip_index: int, block: int, page: int
+    ) -> bytearray | None:
+        """Program待ちのqueueから指定ページのEncode済データを探す"""
+        slot = self.page_queue_pba_to_slot.get(
+            NandConfig.encode_phys_addr(chip_index, block, page, 0)
+        )
+        if slot is None:
+            return None
+        return self.page_queue[slot][3]
+
+    def queue_page(
+        self, chip_index: int, block: int, page: int, data: bytearray
+    ) -> bool:
+        """指定されたページをEncodeしてProgram待ちのqueueに積む"""
+        self.invalidate_page_cache(chip_index, block, page)
+        # データをエンコード (encode結果は新規確保されるのでWrite Bufferを再利用できる)
+        encode_page_data = self.codec.encode(data)
+        if encode_page_data is None:
+            debug(
+                f"FTL\tqueue_page\tcs={chip_index}\tblock={block}\tpage={page}\tencode failed"
+            )
+            return False
+        self.page_queue_pba_to_slot[
+            NandConfig.encode_phys_addr(chip_index, block, page, 0)
+        ] = len(self.page_queue)
+        self.page_queue.append((chip_index, block, page, encode_page_data))
+        return True
+
+    def flush(self) -> bool:
+        """Program待ちのpageをすべて書き込む"""
+        if len(self.page_queue) == 0:
+            return True
+        result = self.blockmng.program_batch(self.page_queue)
+        trace("FTL\tflush\tnum_pages=%s\tresult=%s", len(self.page_queue), result)
+        if not result:
+            debug("FTL\tflush\twrite failed")
+        self.page_queue = list()
+        self.page_queue_pba_to_slot.clear()
+        return result
+
     ########################################################
     # Logical Address Functions
     ########################################################
 
     @staticmethod
-    def unmap_sector() -> bytearray:
-        return bytearray([0x0] * NandConfig.SECTOR_BYTES)
+    def unmap_sector() -> bytes:
+        return _ZERO_SECTOR
 
-    def read_logical(self, lba: LBA) -> bytearray:
+    def read_logical(self, lba: LBA) -> bytes | bytearray | memoryview:
         """指定されたLBAを読み出し"""
         # Write Bufferに書き込み中の場合は、Write Bufferから読み出す
-        if lba in self.write_buffer_lbas:
-            # Write Buffer上のLBAを取得
-            sector_index = self.write_buffer_lbas.index(lba)
-            # Write Buffer上のSectorを取得
+        sector_index = self.write_buffer_lba_to_slot.get(lba)
+        if sector_index is not None:
+            # Write Buffer上のSectorを取得 (Write Bufferは再利用されるのでcopyする)
             sector_data = self.write_buffer[
-                sector_index * NandConfig.SECTOR_BYTES : (sector_index + 1)
-                * NandConfig.SECTOR_BYTES
+                sector_index * _SECTOR_BYTES : (sector_index + 1) * _SECTOR_BYTES
             ]
             trace(
-                f"FTL\tread_logical\tlba={lba}\tsector_index={sector_index}\tread from write buffer"
+                "FTL\tread_logical\tlba=%s\tsector_index=%s\tread from write buffer",
+                lba,
+                sector_index,
             )
             return sector_data
         # LBA -> PBAの変換
@@ -149,66 +391,65 @@ class FlashTranslationLayer:
         return sector_data
 
     def write_logical(self, lba: LBA, data: bytearray) -> bool:
-        """指定されたLBAに書き込む"""
+        """指定されたLBAに書き込む
+        Trueは「Write Buffer/Program待ちのqueueに受け付けた」ことを示し、NANDへのProgram完了は意味しない。
+        Programの成否はこの呼出し中にflushした場合のみ戻り値に含まれ、それ以外はflush()の戻り値で確認する
+        """
+        # Block確保やWrite Bufferの更新前に範囲外のLBAを弾く
+        if not self.mapping.is_valid(lba):
+            raise ValueError(f"Invalid LBA: {lba} (max={self.mapping.num_lba})")
         # 書き込み先Chip/Blockを予約して先頭から使う
-        if (
-            self.current_write_chip is None
-            or self.current_write_block is None
-            or self.current_write_page is None
-            or self.current_write_sector is None
-        ):
-            self.current_write_chip, self.current_write_block = self.blockmng.alloc()
-            self.current_write_page = 0
-            self.current_write_sector = 0
-            self.write_buffer_lbas = list()  # 書き込み先LBAを初期化
-        # PBA決定 + Mapping更新
-        pba = NandConfig.encode_phys_addr(
-            self.current_write_chip,
-            self.current_write_block,
-            self.current_write_page,
-            self.current_write_sector,
-        )
+        pba = self.current_write_pba
+        if pba is None:
+            chip, block = self.blockmng.alloc()
+            pba = NandConfig.encode_phys_addr(chip, block, 0, 0)
+            self.write_buffer_lba_to_slot.clear()  # 書き込み先LBAを初期化
+        # Mapping更新
         self.mapping.update(lba, pba)
         # Write Bufferに書き込み
-        self.write_buffer[
-            self.current_write_sector * NandConfig.SECTOR_BYTES : (
-                self.current_write_sector + 1
-            )
-            * NandConfig.SECTOR_BYTES
-        ] = data
+        sector = pba & _SECTOR_MASK
+        s0, s1 = self._write_slices[sector]
+        self._wbuf_mv[s0:s1] = data
         # Write Buffer上のLBA情報を更新
-        self.write_buffer_lbas.append(lba)
+        self.write_buffer_lbas[sector] = lba
+        self.write_buffer_lba_to_slot[lba] = sector
         trace(
-            f"FTL\twrite_logical\tlba={lba}\tpba={pba}\tchip={self.current_write_chip}\tblock={self.current_write_block}\tpage={self.current_write_page}\tsector={self.current_write_sector}\twrite buffer updated"
+            "FTL\twrite_logical\tlba=%s\tpba=%s\tsector=%s\twrite buffer updated",
+            lba,
+            pba,
+            sector,
         )
 
         # Write Bufferがいっぱいになったら書き込み
-        if len(self.write_buffer_lbas) < NandConfig.SECTOR_PER_PAGE:
+        next_pba = pba + 1
+        if (next_pba & _SECTOR_MASK) != 0:
             # 次のセクタへ移動
-            self.current_write_sector += 1
+            self.current_write_pba = next_pba
             return True
         else:
-            # 書き込み
-            write_result = self.write_page(
-                self.current_write_chip,
-                self.current_write_block,
-                self.current_write_page,
-                self.write_buffer,
-            )
+            # Program待ちのqueueに積む
+            chip, block, page, _ = NandConfig.decode_phys_addr(pba)
+            write_result = self.queue_page(chip, block, page, self.write_buffer)
             trace(
-                f"FTL\twrite_logical\tlba={lba}\tpba={pba}\tchip={self.current_write_chip}\tblock={self.current_write_block}\tpage={self.current_write_page}\tsector={self.current_write_sector}\tlbas={self.write_buffer_lbas}\twrite buffer flushed"
+                "FTL\twrite_logical\tlba=%s\tpba=%s\tchip=%s\tblock=%s\tpage=%s\tlbas=%s\twrite buffer flushed",
+                lba,
+                pba,
+                chip,
+                block,
+                page,
+                self.write_buffer_lbas,
             )
             # 書き込み先LBAを初期化
-            self.write_buffer_lbas = list()
-            # 次のページへ移動
-            self.current_write_sector = 0
-            self.current_write_page += 1
-            # Block内のページを使い切ったら書き込み先を初期化
-            if self.current_write_page >= NandConfig.PAGES_PER_BLOCK:
-                self.current_write_chip = None
-                self.current_write_block = None
-                self.current_write_page = None
-                self.current_write_sector = None
+            self.write_buffer_lba_to_slot.clear()
+            # 次のページへ移動。Block内のページを使い切ったら書き込み先を初期化
+            is_block_end = (next_pba & _BLOCK_OFFSET_MASK) == 0
+            self.current_write_pba = None if is_block_end else next_pba
+            # queueが溜まった or Block境界でまとめて書き込み
+            if (
+                is_block_end
+                or len(self.page_queue) >= FlashTranslationLayer.FLUSH_BATCH
+            ):
+                write_result = self.flush() and write_result
             # 書き込み結果を返却
             return write_result
 
@@ -216,15 +457,21 @@ class FlashTranslationLayer:
 def main() -> None:
     ftl = FlashTranslationLayer()
 
-    def create_test_data(lba: LBA) -> bytearray:
-        return bytearray([lba] * NandConfig.SECTOR_BYTES)
+    def create_test_data(lba: LBA) -> bytes:
+        return bytes((lba,)) * NandConfig.SECTOR_BYTES
 
     for lba in range(0, 10):
         ftl.write_logical(lba, create_test_data(lba))
     for lba in reversed(range(0, 10)):
         read_data = ftl.read_logical(lba)
         assert read_data is not None, f"Read data is None for LBA {lba}"
+    # Program待ちのpageを書き込む
+    ftl.flush()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # 未出力のログを書き出す (excepthook/atexitの無いportでも出力されるように)
+        log_flush()
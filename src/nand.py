@@ -1,6 +1,8 @@
 import sys
+import os
 import json
 import math
+import struct
 from log import error, trace, debug, info, LogLevel
 
 # Physical Block Address
@@ -26,11 +28,14 @@ class NandCmd:
     READ_ID = 0x90
     READ_1ST = 0x00
     READ_2ND = 0x30
+    READ_CACHE_SEQUENTIAL = 0x31
+    READ_CACHE_END = 0x3F
     ERASE_1ST = 0x60
     ERASE_2ND = 0xD0
     STATUS_READ = 0x70
     PROGRAM_1ST = 0x80
     PROGRAM_2ND = 0x10
+    CACHE_PROGRAM_2ND = 0x15
 
 
 class NandStatus:
@@ -58,8 +63,12 @@ class NandConfig:
     PAGE_SPARE_BYTES = 128
     # 2048byte(main) + 128byte(redundancy or other uses)
     PAGE_ALL_BYTES = PAGE_USABLE_BYTES + PAGE_SPARE_BYTES
+    # BadBlock Marker (spare領域先頭byte, 0xFF以外ならBadBlock)
+    BADBLOCK_MARKER_COL = PAGE_USABLE_BYTES
     # number of pages per block
     PAGES_PER_BLOCK = 64
+    # bytes per block (including spare area)
+    BLOCK_ALL_BYTES = PAGE_ALL_BYTES * PAGES_PER_BLOCK
     # number of blocks per CS
     BLOCKS_PER_CS = 1024
     # sector size
@@ -77,6 +86,8 @@ class NandConfig:
     CS_BITS = math.ceil(math.log2(MAX_CS))
     # total bits
     TOTAL_BITS = SECTOR_BITS + PAGE_BITS + BLOCK_BITS + CS_BITS
+    # number of logical sectors (物理sector数と同じ空間を割り当てる)
+    NUM_LBA = 1 << TOTAL_BITS
 
     # sector mask (2^2 - 1 = 0x3)
     SECTOR_MASK = (1 << SECTOR_BITS) - 1
@@ -87,34 +98,58 @@ class NandConfig:
     # cs mask (2^1 - 1 = 0x1)
     CS_MASK = (1 << CS_BITS) - 1
 
+    # page shift (2)
+    PAGE_SHIFT = SECTOR_BITS
+    # block shift (2 + 6 = 8)
+    BLOCK_SHIFT = PAGE_SHIFT + PAGE_BITS
+    # cs shift (8 + 10 = 18)
+    CS_SHIFT = BLOCK_SHIFT + BLOCK_BITS
+
+    # 定数はdefault引数に束縛し、global/属性参照ではなくlocal参照にする (呼び出し側では指定しない)
     @staticmethod
-    def decode_phys_addr(addr: PBA) -> tuple[CHIP, BLOCK, PAGE, SECTOR]:
+    def decode_phys_addr(
+        addr: PBA,
+        _cs_shift: int = CS_SHIFT,
+        _block_shift: int = BLOCK_SHIFT,
+        _page_shift: int = PAGE_SHIFT,
+        _cs_mask: int = CS_MASK,
+        _block_mask: int = BLOCK_MASK,
+        _page_mask: int = PAGE_MASK,
+        _sector_mask: int = SECTOR_MASK,
+    ) -> tuple[CHIP, BLOCK, PAGE, SECTOR]:
         """Decode NAND Flash Address
         | chip[0] | block[9:0] | page[5:0] | sector[1:0] |
         """
-        sector = addr & NandConfig.SECTOR_MASK
-        addr >>= NandConfig.SECTOR_BITS
-        page = addr & NandConfig.PAGE_MASK
-        addr >>= NandConfig.PAGE_BITS
-        block = addr & NandConfig.BLOCK_MASK
-        addr >>= NandConfig.BLOCK_BITS
-        chip = addr & NandConfig.CS_MASK
-        addr >>= NandConfig.CS_BITS
-        return chip, block, page, sector
+        return (
+            (addr >> _cs_shift) & _cs_mask,
+            (addr >> _block_shift) & _block_mask,
+            (addr >> _page_shift) & _page_mask,
+            addr & _sector_mask,
+        )
 
     @staticmethod
-    def encode_phys_addr(chip: CHIP, block: BLOCK, page: PAGE, sector: SECTOR) -> PBA:
+    def encode_phys_addr(
+        chip: CHIP,
+        block: BLOCK,
+        page: PAGE,
+        sector: SECTOR,
+        _cs_shift: int = CS_SHIFT,
+        _block_shift: int = BLOCK_SHIFT,
+        _page_shift: int = PAGE_SHIFT,
+        _cs_mask: int = CS_MASK,
+        _block_mask: int = BLOCK_MASK,
+        _page_mask: int = PAGE_MASK,
+        _sector_mask: int = SECTOR_MASK,
+    ) -> PBA:
         """Encode NAND Flash Address
         | chip[0] | block[9:0] | page[5:0] | sector[1:0] |
         """
-        addr = chip & NandConfig.CS_MASK
-        addr <<= NandConfig.BLOCK_BITS
-        addr |= block & NandConfig.BLOCK_MASK
-        addr <<= NandConfig.PAGE_BITS
-        addr |= page & NandConfig.PAGE_MASK
-        addr <<= NandConfig.SECTOR_BITS
-        addr |= sector & NandConfig.SECTOR_MASK
-        return addr
+        return (
+            ((chip & _cs_mask) << _cs_shift)
+            | ((block & _block_mask) << _block_shift)
+            | ((page & _page_mask) << _page_shift)
+            | (sector & _sector_mask)
+        )
 
     @staticmethod
     def create_nand_addr(block: BLOCK, page: PAGE, col: COLUMN) -> bytearray:
@@ -127,12 +162,43 @@ class NandConfig:
         | 2      | BLOCK[1:0], PAGE[5:0] |
         | 3      | BLOCK[10:2]           |
         """
-        addr = bytearray()
-        addr.append(col & 0xFF)
-        addr.append((col >> 8) & 0xFF)
-        addr.append(((block & 0x3) << 6) | (page & 0x3F))
-        addr.append((block >> 2) & 0xFF)
-        return addr
+        return bytearray(
+            (
+                col & 0xFF,
+                (col >> 8) & 0xFF,
+                ((block & 0x3) << 6) | (page & 0x3F),
+                (block >> 2) & 0xFF,
+            )
+        )
+
+    @staticmethod
+    def create_nand_addr_into(
+        buf: bytearray, block: BLOCK, page: PAGE, col: COLUMN
+    ) -> bytearray:
+        """Create NAND Flash Address into buf[0:4] (page操作毎のallocationを避ける用)"""
+        buf[0] = col & 0xFF
+        buf[1] = (col >> 8) & 0xFF
+        buf[2] = ((block & 0x3) << 6) | (page & 0x3F)
+        buf[3] = (block >> 2) & 0xFF
+        return buf
+
+    @staticmethod
+    def make_addr_builder(col: COLUMN, buf: bytearray | None = None):
+        """colを固定したAddress生成関数を返す (同じcolで多数のpageを扱うloop用)
+        col部分は生成時に1回だけbuf[0:2]へ書き込み、呼び出し毎にはBLOCK/PAGE部分のみ更新する
+        返すbufは呼び出し毎に上書きされる
+        """
+        if buf is None:
+            buf = bytearray(4)
+        buf[0] = col & 0xFF
+        buf[1] = (col >> 8) & 0xFF
+
+        def build(block: BLOCK, page: PAGE) -> bytearray:
+            buf[2] = ((block & 0x3) << 6) | (page & 0x3F)
+            buf[3] = (block >> 2) & 0xFF
+            return buf
+
+        return build
 
     @staticmethod
     def create_block_addr(block: BLOCK) -> bytearray:
@@ -143,10 +209,13 @@ class NandConfig:
         | 0     | BLOCK[7:0]|
         | 1     | BLOCK[15:8]|
         """
-        addr = bytearray()
-        addr.append(block & 0xFF)
-        addr.append((block >> 8) & 0xFF)
-        return addr
+        return bytearray((block & 0xFF, (block >> 8) & 0xFF))
+
+
+# NandBlockManager用
+_ALL_BLOCKS_MASK = (1 << NandConfig.BLOCKS_PER_CS) - 1
+# byte値 -> 最下位の1bitの位置 (0は未使用)。MicroPythonにint.bit_lengthが無いのでtableで引く
+_LOWEST_BIT_TABLE = bytes([0] + [len(bin(x & -x)) - 3 for x in range(1, 256)])
 
 
 ############################################################################
@@ -162,23 +231,50 @@ else:
     import driver_rp2 as d_rp2
 
 
+# 生成済の(nandio, nandcmd)。PIO/DMAの再確保や再初期化を避けるため、keep_wpに関わらず1組だけ使い回す
+_drivers: tuple | None = None
+
+
 def get_driver(
     keep_wp: bool = True,
 ) -> tuple[d_sim.NandIo | d_rp2.NandIo, d_sim.NandCommander | d_rp2.NandCommander]:
+    global _drivers
+    if _drivers is not None:
+        nandio, nandcmd = _drivers
+        if nandio.keep_wp != keep_wp:
+            # WP#の設定のみ変更する
+            nandio.set_keep_wp(keep_wp)
+        return _drivers
     is_sim = sys.platform in sim_platforms
     if is_sim:
         debug("Use Simulator Driver")
         nandio = d_sim.NandIo(keep_wp=keep_wp)
         nandcmd = d_sim.NandCommander(nandio=nandio)
-        return nandio, nandcmd
     else:
         debug("Use RP2040 Driver")
         nandio = d_rp2.NandIo(keep_wp=keep_wp)
         nandcmd = d_rp2.NandCommander(nandio=nandio, timeout_ms=1000)
-        return nandio, nandcmd
+    _drivers = (nandio, nandcmd)
+    return _drivers
+
+
+def _sync_file(f) -> None:
+    """fileの内容を記憶媒体まで書き出す (os.fsyncが無い環境はos.syncで代用)"""
+    f.flush()
+    if hasattr(os, "fsync"):
+        os.fsync(f.fileno())
+    elif hasattr(os, "sync"):
+        os.sync()
 
 
 class NandBlockManager:
+    # save_bin/load_bin のfile header
+    MAGIC = b"BLKA"
+    VERSION = 1
+    HEADER_FORMAT = "<4sBB"
+    # 1CS分のbitmapのbyte数 (1024bit = 128byte)
+    BITMAP_BYTES = NandConfig.BLOCKS_PER_CS // 8
+
     def __init__(
         self,
         nandcmd: d_sim.NandCommander | d_rp2.NandCommander,
@@ -188,26 +284,42 @@ class NandBlockManager:
         initial_badblock_bitmaps: list[int] | None = None,
     ) -> None:
         self._nandcmd = nandcmd
+        # 最後にsave_bin/load_binしたfileと、それ以降にbitmapを変更したか (未変更ならsave_binを省略する)
+        self._saved_path: str | None = None
+        self._dirty = True
+        # _saved_pathの内容を記憶媒体まで書き出し済か (未syncならflush=Trueのsave_binは省略しない)
+        self._synced = False
 
         if not is_initial:
             try:
-                self.load()
-                trace(f"BLKMNG\t{self.__init__.__name__}\tload")
-            except OSError as e:
-                trace(f"BLKMNG\t{self.__init__.__name__}\tload error={e}")
-                is_initial = True
+                self.load_bin()
+                trace("BLKMNG\t__init__\tload_bin")
+            except (OSError, ValueError) as e:
+                trace("BLKMNG\t__init__\tload_bin error=%s", e)
+                # 旧形式(json)からの移行
+                try:
+                    self.load()
+                    trace("BLKMNG\t__init__\tload")
+                except (OSError, ValueError) as e:
+                    trace("BLKMNG\t__init__\tload error=%s", e)
+                    is_initial = True
+                else:
+                    # 次回以降はbinaryから読み込めるよう変換して保存する
+                    self.save_bin()
 
         if is_initial:
-            trace(f"BLKMNG\t{self.__init__.__name__}\tinitialize")
+            trace("BLKMNG\t__init__\tinitialize")
             self.num_chip: CHIP = num_chip
             self.badblock_bitmaps = (
                 initial_badblock_bitmaps if initial_badblock_bitmaps else []
             )
             self.init()
             # save initialized values
-            self.save()
+            self.save_bin()
 
-    def save(self, filepath: str = "nand_block_allocator.json") -> None:
+    def save(
+        self, filepath: str = "nand_block_allocator.json", flush: bool = False
+    ) -> None:
         json_str = json.dumps(
             {
                 "num_chip": self.num_chip,
@@ -215,26 +327,111 @@ class NandBlockManager:
                 "allocated_bitmaps": self.allocated_bitmaps,
             }
         )
-        try:
-            f = open(filepath, "w")
+        with open(filepath, "w") as f:
             f.write(json_str)
-            f.close()
-            trace(f"BLKMNG\t{self.save.__name__}\t{filepath}\t{json_str}")
-        except OSError as e:
-            raise e
+            if flush:
+                _sync_file(f)
+        trace("BLKMNG\tsave\t%s\t%s", filepath, json_str)
 
     def load(self, filepath: str = "nand_block_allocator.json") -> None:
-        try:
-            f = open(filepath, "r")
+        with open(filepath, "r") as f:
             json_text = f.read()
-            data = json.loads(json_text)
-            self.num_chip = data["num_chip"]
-            self.badblock_bitmaps = data["badblock_bitmaps"]
-            self.allocated_bitmaps = data["allocated_bitmaps"]
-            f.close()
-            trace(f"BLKMNG\t{self.load.__name__}\t{filepath}\t{json_text}")
-        except OSError as e:
-            raise e
+        data = json.loads(json_text)
+        self.num_chip = data["num_chip"]
+        self.badblock_bitmaps = data["badblock_bitmaps"]
+        self.allocated_bitmaps = data["allocated_bitmaps"]
+        self._update_free_bitmaps()
+        self._dirty = True
+        trace("BLKMNG\tload\t%s\t%s", filepath, json_text)
+
+    def save_bin(
+        self, filepath: str = "nand_block_allocator.bin", flush: bool = False
+    ) -> None:
+        """bitmapを固定長のbinaryで保存する
+        flush=Trueの場合は記憶媒体への書き込み完了まで待つ (通常はcheckpointから使う)
+
+        | offset | Data                                                  |
+        |--------|-------------------------------------------------------|
+        | 0      | header: magic[4], version (u8), num_chip (u8)         |
+        | 6      | badblock[128] + allocated[128] (little endian) x num_chip |
+        """
+        if (
+            not self._dirty
+            and filepath == self._saved_path
+            and (not flush or self._synced)
+        ):
+            trace("BLKMNG\tsave_bin\t%s\tnot dirty", filepath)
+            return
+        # 1回のwriteで済むよう、file全体をbufferに組み立てる
+        bitmap_bytes = NandBlockManager.BITMAP_BYTES
+        data = bytearray(
+            struct.pack(
+                NandBlockManager.HEADER_FORMAT,
+                NandBlockManager.MAGIC,
+                NandBlockManager.VERSION,
+                self.num_chip,
+            )
+        )
+        for chip_index in range(self.num_chip):
+            data.extend(
+                self.badblock_bitmaps[chip_index].to_bytes(bitmap_bytes, "little")
+            )
+            data.extend(
+                self.allocated_bitmaps[chip_index].to_bytes(bitmap_bytes, "little")
+            )
+        with open(filepath, "wb") as f:
+            f.write(data)
+            if flush:
+                _sync_file(f)
+        self._saved_path = filepath
+        self._dirty = False
+        self._synced = flush
+        trace("BLKMNG\tsave_bin\t%s\tnum_chip=%s", filepath, self.num_chip)
+
+    def load_bin(self, filepath: str = "nand_block_allocator.bin") -> None:
+        """save_binで保存したbinaryを読み込む"""
+        with open(filepath, "rb") as f:
+            raw = f.read()
+        header_bytes = struct.calcsize(NandBlockManager.HEADER_FORMAT)
+        # 途中で切れたfileはunpack前に弾く (bad magicと同じくValueErrorとする)
+        if len(raw) < header_bytes:
+            raise ValueError(f"Invalid Block Allocator File: {filepath}")
+        magic, version, num_chip = struct.unpack(
+            NandBlockManager.HEADER_FORMAT, raw[:header_bytes]
+        )
+        bitmap_bytes = NandBlockManager.BITMAP_BYTES
+        if (
+            magic != NandBlockManager.MAGIC
+            or version != NandBlockManager.VERSION
+            or len(raw) != header_bytes + num_chip * 2 * bitmap_bytes
+        ):
+            raise ValueError(f"Invalid Block Allocator File: {filepath}")
+        badblock_bitmaps = []
+        allocated_bitmaps = []
+        offset = header_bytes
+        for _ in range(num_chip):
+            badblock_bitmaps.append(
+                int.from_bytes(raw[offset : offset + bitmap_bytes], "little")
+            )
+            offset += bitmap_bytes
+            allocated_bitmaps.append(
+                int.from_bytes(raw[offset : offset + bitmap_bytes], "little")
+            )
+            offset += bitmap_bytes
+        self.num_chip = num_chip
+        self.badblock_bitmaps = badblock_bitmaps
+        self.allocated_bitmaps = allocated_bitmaps
+        self._update_free_bitmaps()
+        self._saved_path = filepath
+        self._dirty = False
+        self._synced = True
+        trace("BLKMNG\tload_bin\t%s\tnum_chip=%s", filepath, num_chip)
+
+    def checkpoint(self) -> None:
+        """現在のbitmapを保存し、記憶媒体への書き込み完了まで待つ
+        save_bin(flush=False)で更新した内容を任意のタイミングでまとめて確定させる
+        """
+        self.save_bin(flush=True)
 
     ########################################################
     # Wrapper functions
@@ -244,13 +441,13 @@ class NandBlockManager:
         check_num_chip: CHIP = 2,
         expect_id: bytearray = NandConfig.READ_ID_EXPECT,
     ) -> int:
+        # 5byteのIDは1つのintとして比較する
+        expect = int.from_bytes(expect_id, "big")
         num_chip = 0
         for chip_index in range(check_num_chip):
             id = self._nandcmd.read_id(chip_index=chip_index)
-            is_ok = id == expect_id
-            trace(
-                f"BLKMNG\t{self._check_chip_num.__name__}\tcs={chip_index}\tis_ok={is_ok}"
-            )
+            is_ok = len(id) == len(expect_id) and int.from_bytes(id, "big") == expect
+            trace("BLKMNG\t_check_chip_num\tcs=%s\tis_ok=%s", chip_index, is_ok)
             if not is_ok:
                 return num_chip
             num_chip += 1
@@ -259,25 +456,29 @@ class NandBlockManager:
     def _check_allbadblocks(
         self, chip_index: CHIP, num_blocks: int = NandConfig.BLOCKS_PER_CS
     ) -> int | None:
-        badblock_bitmap = 0
+        # 全Blockの先頭byteをまとめて読み出す
+        first_bytes = self._nandcmd.scan_first_bytes(
+            chip_index=chip_index,
+            blocks=range(num_blocks),
+            page=0,
+            col=NandConfig.BADBLOCK_MARKER_COL,
+        )
+        # Read Exception
+        if first_bytes is None:
+            trace("BLKMNG\t_check_allbadblocks\tcs=%s\tException", chip_index)
+            return None
+        # 8Block毎に1byteへ詰めてから1つのintに変換する (多倍長intのshift/orを繰り返さない)
+        badblock_bytes = bytearray((num_blocks + 7) // 8)
         for block in range(num_blocks):
-            data = self._nandcmd.read_page(
-                chip_index=chip_index, block=block, page=0, col=0, num_bytes=1
-            )
-            # Read Exception
-            if data is None:
+            # Check Bad Block (正常Blockは比較のみで次へ進む)
+            if first_bytes[block] != 0xFF:
+                badblock_bytes[block >> 3] |= 1 << (block & 0x7)
                 trace(
-                    f"BLKMNG\t{self._check_allbadblocks.__name__}\tcs={chip_index}\tblock={block}\tException"
+                    "BLKMNG\t_check_allbadblocks\tcs=%s\tblock=%s\tis_bad=True",
+                    chip_index,
+                    block,
                 )
-                return None
-            # Check Bad Block
-            is_bad = data[0] != 0xFF
-            if is_bad:
-                badblock_bitmap |= 1 << block
-            trace(
-                f"BLKMNG\t{self._check_allbadblocks.__name__}\tcs={chip_index}\tblock={block}\tis_bad={is_bad}"
-            )
-        return badblock_bitmap
+        return int.from_bytes(badblock_bytes, "little")
 
     ########################################################
     # Application functions
@@ -289,7 +490,7 @@ class NandBlockManager:
         if self.num_chip == 0:
             raise ValueError("No Active CS")
 
-        trace(f"BLKMNG\t{self.init.__name__}\tnum_chip={self.num_chip}")
+        trace("BLKMNG\tinit\tnum_chip=%s", self.num_chip)
         # badblock
         if self.badblock_bitmaps is None:
             self.badblock_bitmaps = []
@@ -307,7 +508,9 @@ class NandBlockManager:
                     self.badblock_bitmaps[chip_index] = bitmaps
         for chip_index in range(self.num_chip):
             trace(
-                f"BLKMNG\t{self.init.__name__}\tbadblock\tcs={chip_index}\t{self.badblock_bitmaps[chip_index]:0x}"
+                "BLKMNG\tinit\tbadblock\tcs=%s\t%x",
+                chip_index,
+                self.badblock_bitmaps[chip_index],
             )
         # allocated bitmap
         self.allocated_bitmaps = [0] * self.num_chip
@@ -316,42 +519,97 @@ class NandBlockManager:
             self.allocated_bitmaps[chip_index] = self.badblock_bitmaps[chip_index]
         for chip_index in range(self.num_chip):
             trace(
-                f"BLKMNG\t{self.init.__name__}\tallocated\tcs={chip_index}\t{self.allocated_bitmaps[chip_index]:0x}"
+                "BLKMNG\tinit\tallocated\tcs=%s\t%x",
+                chip_index,
+                self.allocated_bitmaps[chip_index],
             )
+        self._update_free_bitmaps()
+        self._dirty = True
+
+    def _update_free_bitmaps(self) -> None:
+        """allocated/badblockのどちらでもないBlockのbitmapを作り直す (保存はせず、load/init時に導出する)"""
+        self.free_bitmaps: list[BLOCK_BITMAP] = [
+            _ALL_BLOCKS_MASK
+            & ~(self.allocated_bitmaps[chip_index] | self.badblock_bitmaps[chip_index])
+            for chip_index in range(self.num_chip)
+        ]
+        # CS毎の探索開始位置。これより前のBlockに空きは無い (_pick_freeで進め、_mark_freeで戻す)
+        self._next_free_hint: list[BLOCK] = [0] * self.num_chip
+
+    @staticmethod
+    def _lowest_bit(bitmap: BLOCK_BITMAP) -> int:
+        # 最下位の1bitだけ残し、32bit/8bit単位で0を読み飛ばしてからtableで位置を引く
+        lowest = bitmap & -bitmap
+        pos = 0
+        while (lowest & 0xFFFFFFFF) == 0:
+            lowest >>= 32
+            pos += 32
+        while (lowest & 0xFF) == 0:
+            lowest >>= 8
+            pos += 8
+        return pos + _LOWEST_BIT_TABLE[lowest & 0xFF]
 
     def _pick_free(self) -> tuple[CHIP | None, BLOCK | None]:
-        # 先頭から空きを探す
+        # 空きのあるCSの先頭から空きを探す
         for chip_index in range(self.num_chip):
-            for block in range(NandConfig.BLOCKS_PER_CS):
-                # free & not badblock
-                if (self.allocated_bitmaps[chip_index] & (1 << block)) == 0 and (
-                    self.badblock_bitmaps[chip_index] & (1 << block)
-                ) == 0:
-                    return chip_index, block
+            free = self.free_bitmaps[chip_index]
+            if free == 0:
+                continue
+            # 前回の位置から探し、見つからなければ先頭から探し直す
+            hint = self._next_free_hint[chip_index]
+            ahead = free >> hint
+            if ahead != 0:
+                block = hint + NandBlockManager._lowest_bit(ahead)
+            else:
+                block = NandBlockManager._lowest_bit(free)
+            self._next_free_hint[chip_index] = block + 1
+            return chip_index, block
         return None, None
 
     def _mark_alloc(self, chip_index: CHIP, block: BLOCK) -> None:
-        if (self.allocated_bitmaps[chip_index] & (1 << block)) != 0:
+        # 多倍長intのshiftは1回だけ行い、以降は使い回す
+        bit = 1 << block
+        if (self.allocated_bitmaps[chip_index] & bit) != 0:
             raise ValueError("Block Already Allocated")
 
-        self.allocated_bitmaps[chip_index] |= 1 << block
+        self.allocated_bitmaps[chip_index] |= bit
+        self.free_bitmaps[chip_index] &= ~bit
+        self._dirty = True
         trace(
-            f"BLKMNG\t{self._mark_alloc.__name__}\tcs={chip_index}\tblock={block}\t{self.allocated_bitmaps[chip_index]:0x}"
+            "BLKMNG\t_mark_alloc\tcs=%s\tblock=%s\t%x",
+            chip_index,
+            block,
+            self.allocated_bitmaps[chip_index],
         )
 
     def _mark_free(self, chip_index: CHIP, block: BLOCK) -> None:
-        if (self.allocated_bitmaps[chip_index] & (1 << block)) == 0:
+        bit = 1 << block
+        if (self.allocated_bitmaps[chip_index] & bit) == 0:
             raise ValueError("Block Already Free")
 
-        self.allocated_bitmaps[chip_index] &= ~(1 << block)
+        self.allocated_bitmaps[chip_index] &= ~bit
+        self._dirty = True
+        if (self.badblock_bitmaps[chip_index] & bit) == 0:
+            self.free_bitmaps[chip_index] |= bit
+            if block < self._next_free_hint[chip_index]:
+                self._next_free_hint[chip_index] = block
         trace(
-            f"BLKMNG\t{self._mark_free.__name__}\tcs={chip_index}\tblock={block}\t{self.allocated_bitmaps[chip_index]:0x}"
+            "BLKMNG\t_mark_free\tcs=%s\tblock=%s\t%x",
+            chip_index,
+            block,
+            self.allocated_bitmaps[chip_index],
         )
 
     def _mark_bad(self, chip_index: CHIP, block: BLOCK) -> None:
-        self.badblock_bitmaps[chip_index] |= 1 << block
+        bit = 1 << block
+        self.badblock_bitmaps[chip_index] |= bit
+        self.free_bitmaps[chip_index] &= ~bit
+        self._dirty = True
         trace(
-            f"BLKMNG\t{self._mark_bad.__name__}\tcs={chip_index}\tblock={block}\t{self.badblock_bitmaps[chip_index]:0x}"
+            "BLKMNG\t_mark_bad\tcs=%s\tblock=%s\t%x",
+            chip_index,
+            block,
+            self.badblock_bitmaps[chip_index],
         )
 
     def alloc(self) -> tuple[CHIP, BLOCK]:
@@ -364,39 +622,138 @@ class NandBlockManager:
                 is_erase_ok = self._nandcmd.erase_block(chip_index=cs, block=block)
                 if is_erase_ok:
                     self._mark_alloc(chip_index=cs, block=block)
-                    trace(f"BLKMNG\t{self.alloc.__name__}\tcs={cs}\tblock={block}")
+                    trace("BLKMNG\talloc\tcs=%s\tblock=%s", cs, block)
                     return cs, block
                 else:
                     # Erase失敗、BadBlockとしてマークし、Freeせず次のBlockを探す
                     self._mark_bad(chip_index=cs, block=block)
-                    trace(
-                        f"BLKMNG\t{self.alloc.__name__}\tcs={cs}\tblock={block}\tErase Failed"
-                    )
+                    trace("BLKMNG\talloc\tcs=%s\tblock=%s\tErase Failed", cs, block)
 
     def free(self, chip_index: CHIP, block: BLOCK) -> None:
-        trace(f"BLKMNG\t{self.free.__name__}\tcs={chip_index}\tblock={block}")
+        trace("BLKMNG\tfree\tcs=%s\tblock=%s", chip_index, block)
         self._mark_free(chip_index=chip_index, block=block)
 
-    def read(self, chip_index: CHIP, block: BLOCK, page: PAGE) -> bytearray | None:
+    def read(
+        self,
+        chip_index: CHIP,
+        block: BLOCK,
+        page: PAGE,
+        buf: bytearray | None = None,
+    ) -> bytearray | None:
+        trace("BLKMNG\tread\tcs=%s\tblock=%s\tpage=%s", chip_index, block, page)
+        return self._nandcmd.read_page(
+            chip_index=chip_index, block=block, page=page, buf=buf
+        )
+
+    def read_sequence(
+        self,
+        chip_index: CHIP,
+        block: BLOCK,
+        start_page: PAGE,
+        num_pages: int,
+    ) -> list[bytearray] | None:
+        """同一Block内の連続pageをCache Readでまとめて読み出す"""
         trace(
-            f"BLKMNG\t{self.read.__name__}\tcs={chip_index}\tblock={block}\tpage={page}"
+            "BLKMNG\tread_sequence\tcs=%s\tblock=%s\tpage=%s\tnum_pages=%s",
+            chip_index,
+            block,
+            start_page,
+            num_pages,
+        )
+        return self._nandcmd.read_page_sequential(
+            chip_index=chip_index,
+            block=block,
+            start_page=start_page,
+            num_pages=num_pages,
+        )
+
+    def read_block(self, chip_index: CHIP, block: BLOCK) -> list[bytearray] | None:
+        """Block内の全pageを読み出す"""
+        return self.read_sequence(
+            chip_index=chip_index,
+            block=block,
+            start_page=0,
+            num_pages=NandConfig.PAGES_PER_BLOCK,
         )
-        return self._nandcmd.read_page(chip_index=chip_index, block=block, page=page)
+
+    def read_issue(self, chip_index: CHIP, block: BLOCK, page: PAGE) -> None:
+        """Read Commandのみ発行する。read_completeでデータを受け取るまでの間に別処理を行える"""
+        trace("BLKMNG\tread_issue\tcs=%s\tblock=%s\tpage=%s", chip_index, block, page)
+        self._nandcmd.read_page_issue(chip_index=chip_index, block=block, page=page)
+
+    def read_complete(
+        self, chip_index: CHIP, buf: bytearray | None = None
+    ) -> bytearray | None:
+        """read_issueで発行したReadのデータを受け取る"""
+        return self._nandcmd.read_page_complete(chip_index=chip_index, buf=buf)
 
     def program(
         self, chip_index: CHIP, block: BLOCK, page: PAGE, data: bytearray
     ) -> bool:
-        trace(
-            f"BLKMNG\t{self.program.__name__}\tcs={chip_index}\tblock={block}\tpage={page}"
-        )
+        trace("BLKMNG\tprogram\tcs=%s\tblock=%s\tpage=%s", chip_index, block, page)
         return self._nandcmd.program_page(
             chip_index=chip_index, block=block, page=page, data=data
         )
 
+    def program_sequence(
+        self,
+        chip_index: CHIP,
+        block: BLOCK,
+        start_page: PAGE,
+        pages: list[bytearray],
+    ) -> bool:
+        """同一Block内の連続pageをCache Programでまとめて書き込む"""
+        trace(
+            "BLKMNG\tprogram_sequence\tcs=%s\tblock=%s\tpage=%s\tnum_pages=%s",
+            chip_index,
+            block,
+            start_page,
+            len(pages),
+        )
+        return self._nandcmd.program_sequence(
+            chip_index=chip_index, block=block, start_page=start_page, pages=pages
+        )
+
+    def program_batch(self, pages: list[tuple[CHIP, BLOCK, PAGE, bytearray]]) -> bool:
+        """(chip, block, page, data) のlistを書き込む。1pageでも失敗したらFalse
+        同一Block内で連続するpageはprogram_sequenceでまとめて書き込む
+        """
+        trace("BLKMNG\tprogram_batch\tnum_pages=%s", len(pages))
+        # TODO: 複数CSに跨る場合、あるCSのBusy中に別CSへProgram/Eraseを発行してoverlapする
+        #       (FTLは1 Blockずつ順に書き込むため、現状はCS毎のscheduler無しで逐次発行する)
+        is_ok = True
+        i = 0
+        while i < len(pages):
+            chip_index, block, start_page, data = pages[i]
+            datas = [data]
+            i += 1
+            while i < len(pages):
+                next_chip, next_block, next_page, next_data = pages[i]
+                if (
+                    next_chip != chip_index
+                    or next_block != block
+                    or next_page != start_page + len(datas)
+                ):
+                    break
+                datas.append(next_data)
+                i += 1
+            if not self.program_sequence(chip_index, block, start_page, datas):
+                trace(
+                    "BLKMNG\tprogram_batch\tcs=%s\tblock=%s\tpage=%s\tProgram Failed",
+                    chip_index,
+                    block,
+                    start_page,
+                )
+                is_ok = False
+        return is_ok
+
 
 class Lfsr8:
     """Linear Feedback Shift Register"""
 
+    # seed -> 状態遷移table (table[state] = 1step後のstate)
+    _next_tables: dict[int, bytes] = dict()
+
     def __init__(
         self,
         init_value: int = 1,
@@ -405,6 +762,17 @@ class Lfsr8:
         self._init_value = init_value
         self._current = init_value
         self._seed = seed
+        self._next_table = Lfsr8._get_next_table(seed)
+
+    @staticmethod
+    def _get_next_table(seed: int) -> bytes:
+        table = Lfsr8._next_tables.get(seed)
+        if table is None:
+            # 8bitの全stateについてshift/xorを事前に計算しておく (xorする値は最下位bitで(0, seed)から選ぶ)
+            feedback = (0, seed & 0xFF)
+            table = bytes([(state >> 1) ^ feedback[state & 1] for state in range(256)])
+            Lfsr8._next_tables[seed] = table
+        return table
 
     def reset(self, init_value: int | None = None):
         if init_value is not None:
@@ -413,9 +781,7 @@ class Lfsr8:
             self._current = self._init_value
 
     def next(self) -> int:
-        self._current = (
-            (self._current >> 1) ^ (-(self._current & 1) & self._seed)
-        ) & 0xFF
+        self._current = self._next_table[self._current & 0xFF]
         return self._current
 
 
@@ -425,10 +791,16 @@ class PageCodec:
     Reference: https://github.com/wipeseals/broccoli/blob/main/misc/design-memo/data-layout.ipynb
     """
 
+    # 未使用のspare領域 (消去状態と同じ0xFF。先頭byteはBadBlock Markerと重なるので書き込み済Blockを誤検出しない)
+    _SPARE_FILL = b"\xff" * NandConfig.PAGE_SPARE_BYTES
+    # scramble_seed -> keystream (int)。同じseedのPageCodecを複数生成してもLFSRは1回だけ回す
+    _keystream_cache: dict[int, int] = dict()
+
     def __init__(
         self,
         scramble_seed: int = 0xA5,
-        use_scramble: bool = True,
+        # scrambleはNANDへ書き込むdataの形式が変わるので、明示的に指定した場合のみ有効にする
+        use_scramble: bool = False,
         use_ecc: bool = True,
         use_crc: bool = True,
     ) -> None:
@@ -436,25 +808,69 @@ class PageCodec:
         self._use_scramble = use_scramble
         self._use_ecc = use_ecc
         self._use_crc = use_crc
+        # scramble用keystream (seedのみで決まるので1page分を生成し、intとして保持)
+        self._keystream = 0
+        if use_scramble:
+            self._keystream = PageCodec._get_keystream(scramble_seed)
+        # 設定は生成後に変わらないので、各段の処理を初期化時に選択しておく (encode/decode毎の分岐を省略)
+        self._transform_into = self._scramble_into if use_scramble else self._copy_into
 
-    def encode(self, data: bytearray) -> bytearray:
+    @staticmethod
+    def _get_keystream(seed: int) -> int:
+        keystream = PageCodec._keystream_cache.get(seed)
+        if keystream is None:
+            lfsr = Lfsr8(seed=seed)
+            keystream = int.from_bytes(
+                bytes([lfsr.next() for _ in range(NandConfig.PAGE_USABLE_BYTES)]),
+                "little",
+            )
+            PageCodec._keystream_cache[seed] = keystream
+        return keystream
+
+    def _scramble_into(self, src: bytearray | memoryview, dst: bytearray) -> None:
+        # page全体を1つのintとしてXORし、dst[0:PAGE_USABLE_BYTES]へ書き込む (scramble/descrambleは同じ処理)
+        x = int.from_bytes(src, "little") ^ self._keystream
+        dst[: NandConfig.PAGE_USABLE_BYTES] = x.to_bytes(
+            NandConfig.PAGE_USABLE_BYTES, "little"
+        )
+
+    @staticmethod
+    def _copy_into(src: bytearray | memoryview, dst: bytearray) -> None:
+        dst[: NandConfig.PAGE_USABLE_BYTES] = src
+
+    def encode(self, data: bytearray, out: bytearray | None = None) -> bytearray:
+        """data(PAGE_USABLE_BYTES)をEncodeしてPAGE_ALL_BYTESを返す
+        outを指定した場合は新規確保せずそこへ書き込む
+        """
         assert len(data) == NandConfig.PAGE_USABLE_BYTES
-        # TODO: scramble
-        # lfsr = Lfsr8(seed=self._scramble_seed)
-        # data = bytearray([lfsr.next() ^ x for x in data])
-        # TODO: ecc
-        # TODO: crc
-        return data + bytearray(
-            [0x00] * NandConfig.PAGE_SPARE_BYTES
-        )  # TODO: 正式なParity付与
-
-    def decode(self, data: bytearray) -> bytearray | None:
+        if out is None:
+            out = bytearray(NandConfig.PAGE_ALL_BYTES)
+        else:
+            assert len(out) == NandConfig.PAGE_ALL_BYTES
+        out[NandConfig.PAGE_USABLE_BYTES :] = PageCodec._SPARE_FILL
+        # scramble
+        self._transform_into(data, out)
+        # TODO: ecc (self._use_ecc)
+        # TODO: crc (self._use_crc)
+        # TODO: 正式なParity付与
+        return out
+
+    def decode(
+        self, data: bytearray | memoryview, out: bytearray | None = None
+    ) -> bytearray | None:
+        """data(PAGE_ALL_BYTES)をDecodeしてPAGE_USABLE_BYTESを返す
+        outを指定した場合は新規確保せずそこへ書き込む
+        """
         assert len(data) == NandConfig.PAGE_ALL_BYTES
-
-        # TODO: crc
-        # TODO: ecc
-        # TODO: descramble
-        # lfsr = Lfsr8(seed=self._scramble_seed)
-        # data = bytearray([lfsr.next() ^ x for x in data])
+        # Parity除去 (copyせずviewで参照する)
+        src = memoryview(data)[: NandConfig.PAGE_USABLE_BYTES]
+        # TODO: crc (self._use_crc)
+        # TODO: ecc (self._use_ecc)
         # TODO: CRC Errorを解消できなかった場合、エラー応答する
-        return data[: NandConfig.PAGE_USABLE_BYTES]  # Parity除去
+        if out is None:
+            out = bytearray(NandConfig.PAGE_USABLE_BYTES)
+        else:
+            assert len(out) == NandConfig.PAGE_USABLE_BYTES
+        # descramble
+        self._transform_into(src, out)
+        return out